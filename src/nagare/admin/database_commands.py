@@ -7,11 +7,46 @@
 # this distribution.
 # --
 
+import os
+import csv
+import sys
+import json
+import time
+import itertools
+import contextlib
+from concurrent import futures
+
 import transaction
 
+from nagare import commands
 from nagare.admin import command
 
 
+def find_table(database_service, db, name):
+    tables = [
+        metadata.tables[name]
+        for metadata in database_service.metadatas
+        if ((db is None) or (db == metadata.name)) and (name in metadata.tables)
+    ]
+
+    if not tables:
+        raise commands.ArgumentError("table '{}' not found".format(name))
+
+    if len(tables) > 1:
+        raise commands.ArgumentError("table '{}' found in several databases, use the --db option".format(name))
+
+    return tables[0]
+
+
+def print_durations(action, durations, jobs):
+    # The durations are only reported for parallel runs, to keep the default output unchanged
+    if jobs <= 1:
+        return
+
+    for name, duration in sorted(durations.items()):
+        print('Database `{}` {} in {:.2f}s'.format(name, action, duration))
+
+
 class Commands(command.Commands):
     DESC = 'RDBMS subcommands'
 
@@ -25,14 +60,27 @@ class Create(command.Command):
 
         parser.add_argument('--db', help='database')
         parser.add_argument('--drop', action='store_true', help='drop the database tables before to re-create them')
+        parser.add_argument('-j', '--jobs', type=int, default=1, help='number of databases processed in parallel')
+        parser.add_argument(
+            '--template',
+            nargs='?',
+            const='',
+            metavar='DIRECTORY',
+            help='copy the SQLite databases from templates, cached in DIRECTORY (default: the `templates` option)',
+        )
 
     @staticmethod
-    def run(database_service, application_service, services_service, db, drop):
+    def run(database_service, application_service, services_service, db, drop, jobs, template):
+        if template is not None:
+            database_service.clone_all(db, application_service.service, services_service, template or None)
+            return
+
+        # Only the DDL is parallelized, the populate functions share the zope transaction
         with transaction.manager:
             if drop:
-                database_service.drop_all(db)
+                print_durations('dropped', database_service.drop_all(db, jobs), jobs)
 
-            database_service.create_all(db)
+            print_durations('created', database_service.create_all(db, jobs), jobs)
             database_service.populate_all(db, application_service.service, services_service)
 
 
@@ -43,8 +91,182 @@ class Drop(command.Command):
     def set_arguments(self, parser):
         super().set_arguments(parser)
         parser.add_argument('--db', help='database')
+        parser.add_argument('-j', '--jobs', type=int, default=1, help='number of databases processed in parallel')
 
     @staticmethod
-    def run(database_service, db):
+    def run(database_service, db, jobs):
         with transaction.manager:
-            database_service.drop_all(db)
+            print_durations('dropped', database_service.drop_all(db, jobs), jobs)
+
+
+class Counters(command.Command):
+    DESC = 'rebuild the children counters of the OneToMany relationships'
+    WITH_STARTED_SERVICES = True
+
+    def set_arguments(self, parser):
+        super().set_arguments(parser)
+        parser.add_argument('--db', help='database')
+
+    @staticmethod
+    def run(database_service, db):
+        database_service.rebuild_counters(db)
+
+
+class Load(command.Command):
+    DESC = 'bulk load a CSV or JSON lines file into a database table'
+    WITH_STARTED_SERVICES = True
+
+    def set_arguments(self, parser):
+        super().set_arguments(parser)
+
+        parser.add_argument('--db', help='database')
+        parser.add_argument(
+            '-f', '--format', dest='file_format', choices=('csv', 'jsonl'), help='file format (default: file extension)'
+        )
+        parser.add_argument('--columns', help='comma separated list of columns, when the CSV file has no header row')
+        parser.add_argument(
+            '--null', default='', help="CSV value loaded as NULL (default: ''). Use another value to load empty strings"
+        )
+        parser.add_argument('--batch-size', type=int, default=10000, help='number of rows sent at once')
+        parser.add_argument('table', help='table to load')
+        parser.add_argument('file', help="CSV or JSON lines file ('-' for the standard input)")
+
+    @staticmethod
+    def read_csv(f, columns, null=''):
+        reader = csv.reader(f)
+        columns = columns or next(reader, [])
+
+        return columns, ([None if value == null else value for value in row] for row in reader)
+
+    @staticmethod
+    def read_jsonl(f, columns):
+        rows = (json.loads(line) for line in f if line.strip())
+
+        first = next(rows, None)
+        if first is None:
+            return columns or [], iter(())
+
+        columns = columns or list(first)
+
+        return columns, ([row.get(column) for column in columns] for row in itertools.chain([first], rows))
+
+    def run(self, database_service, db, file_format, columns, null, batch_size, table, file):
+        table = find_table(database_service, db, table)
+        columns = columns.split(',') if columns else None
+        file_format = file_format or os.path.splitext(file)[1][1:].lower()
+
+        if file_format not in ('csv', 'jsonl'):
+            raise commands.ArgumentError('unknown file format, use the --format option')
+
+        with contextlib.nullcontext(sys.stdin) if file == '-' else open(file, newline='', encoding='utf-8') as f:
+            if file_format == 'csv':
+                columns, rows = self.read_csv(f, columns, null)
+            else:
+                columns, rows = self.read_jsonl(f, columns)
+
+            t0 = time.perf_counter()
+            nb = database_service.bulk_load(table, columns, rows, batch_size)
+            duration = time.perf_counter() - t0
+
+        print(
+            '{} rows loaded into `{}` in {:.2f}s ({:.0f} rows/s)'.format(
+                nb, table.name, duration, nb / duration if duration else 0
+            )
+        )
+
+        return 0
+
+
+class Dump(command.Command):
+    DESC = 'export database tables as CSV or JSON lines'
+    WITH_STARTED_SERVICES = True
+
+    def set_arguments(self, parser):
+        super().set_arguments(parser)
+
+        parser.add_argument('--db', help='database')
+        parser.add_argument(
+            '-t', '--table', dest='tables', action='append', help='table to export (default: all the tables)'
+        )
+        parser.add_argument(
+            '-f', '--format', dest='file_format', choices=('csv', 'jsonl'), default='csv', help='output format'
+        )
+        parser.add_argument(
+            '-o',
+            '--output',
+            help='output file when a single --table is given and the path is not a directory, else output directory'
+            ' (default: stdout)',
+        )
+        parser.add_argument('--chunk-size', type=int, default=10000, help='number of rows fetched at once')
+        parser.add_argument('-j', '--jobs', type=int, default=4, help='number of tables exported in parallel')
+
+    @staticmethod
+    def write_csv(f, columns, partitions):
+        writer = csv.writer(f)
+        writer.writerow(columns)
+
+        nb = 0
+        for rows in partitions:
+            writer.writerows(rows)
+            nb += len(rows)
+
+        return nb
+
+    @staticmethod
+    def write_jsonl(f, columns, partitions):
+        nb = 0
+        for rows in partitions:
+            f.writelines(json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=str) + '\n' for row in rows)
+            nb += len(rows)
+
+        return nb
+
+    def dump(self, engine, table, file_format, output, chunk_size):
+        t0 = time.perf_counter()
+
+        with contextlib.nullcontext(sys.stdout) if output is None else open(
+            output, 'w', newline='', encoding='utf-8'
+        ) as f, engine.connect() as connection:
+            result = connection.execution_options(yield_per=chunk_size).execute(table.select())
+            nb = getattr(self, 'write_' + file_format)(f, list(result.keys()), result.partitions())
+
+        duration = time.perf_counter() - t0
+        print('{} rows exported from `{}` in {:.2f}s'.format(nb, table.name, duration), file=sys.stderr)
+
+        return nb
+
+    def run(self, database_service, db, tables, file_format, output, chunk_size, jobs):
+        # Only one explicitly given table can be exported into a file
+        to_directory = (output is not None) and ((len(tables or ()) != 1) or os.path.isdir(output))
+
+        if tables:
+            tables = [find_table(database_service, db, name) for name in tables]
+        else:
+            tables = [
+                table
+                for metadata in database_service.metadatas
+                if (db is None) or (db == metadata.name)
+                for table in metadata.sorted_tables
+            ]
+
+        if (output is None) and (len(tables) > 1):
+            raise commands.ArgumentError('several tables to export, use the --output option to give a directory')
+
+        if not to_directory:
+            outputs = [output] * len(tables)
+        else:
+            os.makedirs(output, exist_ok=True)
+            outputs = [os.path.join(output, table.name + '.' + file_format) for table in tables]
+
+        with futures.ThreadPoolExecutor(max(jobs, 1)) as executor:
+            dumps = [
+                executor.submit(
+                    self.dump, database_service.get_engine(table.metadata), table, file_format, output, chunk_size
+                )
+                for table, output in zip(tables, outputs)
+            ]
+
+            for dump in dumps:
+                dump.result()
+
+        return 0
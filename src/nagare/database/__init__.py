@@ -9,15 +9,24 @@
 
 from nagare.services.database import (
     query,
+    batched,
     session,
     metadata,
     get_engine,
+    set_tenant,
     get_metadata,
     get_metadatas,
+    set_read_only,
     configure_mappers,
     configure_database,
 )
-from nagare.services.database_exceptions import InvalidVersion
+from nagare.services.database_exceptions import (
+    StaleEntity,
+    ReadOnlyError,
+    InvalidVersion,
+    DatabaseTimeout,
+    DatabaseUnavailable,
+)
 
 from .pickle import NonSerializable
 from .declarative import Field, Entity, OneToOne, ManyToOne, OneToMany, ManyToMany
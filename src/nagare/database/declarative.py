@@ -7,22 +7,155 @@
 # this distribution.
 # --
 
-from sqlalchemy import Table, Integer, ForeignKey, orm
+import array
+import itertools
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from sqlalchemy import (
+    JSON,
+    Float,
+    Table,
+    String,
+    Boolean,
+    Integer,
+    ForeignKey,
+    PickleType,
+    LargeBinary,
+    orm,
+    sql,
+    func,
+    event,
+    delete,
+    select,
+    tuple_,
+    update,
+    bindparam,
+)
 from sqlalchemy import Column as Field
 
 from nagare import log
 from nagare.services import database
 
 
+class PagedCollection(orm.Query):
+    """Collection of a ``collection='paged'`` relationship.
+
+    The items are never all loaded: the collection can be appended to, removed
+    from, counted, filtered as a query and iterated by batches.
+    """
+
+    def batches(self, size=1000):
+        """Iterate over the items of the collection, by lists of ``size`` items."""
+        items = iter(self.yield_per(size))
+        while True:
+            batch = list(itertools.islice(items, size))
+            if not batch:
+                break
+
+            yield batch
+
+
+def is_large_field(field, length=255):
+    """Is a field a blob, a JSON document or a text longer than ``length``?"""
+    field_type = field.type
+    if isinstance(field_type, (LargeBinary, JSON, PickleType)):
+        return True
+
+    return isinstance(field_type, String) and ((field_type.length is None) or (field_type.length > length))
+
+
+def split_columns_and_criteria(cls, columns_and_criteria):
+    """Separate the boolean expressions, used as criteria, from the columns to select."""
+    columns = []
+    criteria = []
+
+    for arg in columns_and_criteria:
+        is_criterion = (
+            isinstance(arg, sql.ColumnElement)
+            and isinstance(arg.type, Boolean)
+            and not isinstance(arg, (sql.expression.ColumnClause, sql.expression.Label))
+        )
+        (criteria if is_criterion else columns).append(arg)
+
+    # The mapped attributes, not the table columns, bind the statement to the entity engine
+    return columns or [prop.class_attribute for prop in cls.__mapper__.column_attrs], criteria
+
+
+def array_typecode(field_type):
+    """Typecode of the ``array.array`` storing the values of a field type, if any."""
+    for array_type, typecode in ((Boolean, 'b'), (Integer, 'q'), (Float, 'd')):
+        if isinstance(field_type, array_type):
+            return typecode
+
+    return None
+
+
+def coerce_key(column, value):
+    """Value of a primary key column converted to the Python type of the column, if known."""
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+
+    if (value is None) or isinstance(value, python_type):
+        return value
+
+    try:
+        return python_type(value)
+    except (TypeError, ValueError):
+        return value
+
+
+class StatementsCache(dict):
+    """Statements built by the query helpers of an entity class."""
+
+    def __init__(self):
+        super().__init__()
+        self.hits = self.misses = 0
+
+    def get_statement(self, key, build):
+        statement = self.get(key)
+        if statement is None:
+            self.misses += 1
+            statement = self[key] = build()
+        else:
+            self.hits += 1
+
+        return statement
+
+    def info(self):
+        nb = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self),
+            'hit_rate': (self.hits / nb) if nb else 0.0,
+        }
+
+
 class FKRelationship(database.FKRelationshipBase):
     RELATIONSHIP_NAME = ''
     INVERSE_RELATIONSHIP_NAME = ()
+    COLLECTIONS = {
+        'write_only': {'lazy': 'write_only'},
+        'paged': {'lazy': 'dynamic', 'query_class': PagedCollection},
+    }
+
+    def __init__(self, target, colname=None, inverse=None, collection_class=None, collection=None, **kw):
+        if (collection is not None) and (collection not in self.COLLECTIONS):
+            raise ValueError(
+                'Invalid collection "{}", must be one of {}'.format(collection, ', '.join(sorted(self.COLLECTIONS)))
+            )
 
-    def __init__(self, target, colname=None, inverse=None, collection_class=None, **kw):
         self.target = target
         self.colname = colname
         self.inverse = inverse
         self.collection_class = collection_class
+        self.collection = collection
         self.relationship_kwargs = kw
 
     @staticmethod
@@ -68,7 +201,22 @@ class FKRelationship(database.FKRelationshipBase):
 
         return target_rel_name, target_rel
 
-    def config(self, local_cls, key, collection_class, inverse_foreign_keys):
+    @staticmethod
+    def default_lazy(cls, uselist, default_lazy_collection, default_lazy_scalar):
+        if uselist:
+            return cls.using_options.get('default_lazy_collection') or default_lazy_collection
+
+        return cls.using_options.get('default_lazy_scalar') or default_lazy_scalar
+
+    def config(
+        self,
+        local_cls,
+        key,
+        collection_class,
+        inverse_foreign_keys,
+        default_lazy_collection='select',
+        default_lazy_scalar='select',
+    ):
         target_cls = self.target_cls(local_cls)
         if target_cls is None:
             raise ValueError('In {}, relation "{}", target table "{}" not found'.format(local_cls, key, self.target))
@@ -80,9 +228,22 @@ class FKRelationship(database.FKRelationshipBase):
 
         if (target_rel_name is not None) and (target_rel is None):
             relationship_kwargs['backref'] = orm.backref(
-                target_rel_name, uselist=backref_uselist, collection_class=self.collection_class or collection_class
+                target_rel_name,
+                uselist=backref_uselist,
+                collection_class=self.collection_class or collection_class,
+                lazy=self.default_lazy(target_cls, backref_uselist, default_lazy_collection, default_lazy_scalar),
             )
 
+        if self.collection is not None:
+            relationship_kwargs.update(self.COLLECTIONS[self.collection])
+
+        relationship_kwargs.setdefault(
+            'lazy',
+            self.default_lazy(
+                local_cls, relationship_kwargs.get('uselist', True), default_lazy_collection, default_lazy_scalar
+            ),
+        )
+
         rel = orm.relationship(
             target_cls,
             collection_class=self.collection_class or collection_class,
@@ -101,10 +262,65 @@ class OneToMany(FKRelationship):
     RELATIONSHIP_NAME = 'OneToMany'
     INVERSE_RELATIONSHIP_NAME = ('ManyToOne',)
 
+    def __init__(
+        self, target, colname=None, inverse=None, collection_class=None, collection=None, counter_cache=None, **kw
+    ):
+        if counter_cache and isinstance(self, (ManyToOne, OneToOne)):
+            raise ValueError(
+                'Invalid counter_cache "{}", only available on the OneToMany relationships'.format(counter_cache)
+            )
+
+        super().__init__(target, colname, inverse, collection_class, collection, **kw)
+        self.counter_cache = counter_cache
+
     @staticmethod
     def create_foreign_field_params(index=True, nullable=True, primary_key=False, **kw):
         return {'index': index, 'nullable': nullable, 'primary_key': primary_key}, kw
 
+    @staticmethod
+    def committed_value(mapper, connection, target, column):
+        history = orm.attributes.get_history(target, column.key)
+        if history.deleted or history.unchanged:
+            return (history.deleted or history.unchanged)[0]
+
+        if not history.added:
+            return None
+
+        # Value changed before the previous one was loaded
+        identity = orm.attributes.instance_state(target).identity
+        return connection.scalar(select(column).where(*[pk == v for pk, v in zip(mapper.primary_key, identity)]))
+
+    def create_counter_cache(self, local_cls, target_cls, pk, foreign_key):
+        """Keep the number of children up to date in the ``counter_cache`` column of the parents."""
+        counter = local_cls.__table__.c[self.counter_cache]
+        foreign_key = foreign_key.expression
+        local_cls.metadata.info.setdefault('counter_caches', []).append((counter, pk, foreign_key, local_cls))
+
+        def update_counter(connection, target, parent_id, delta):
+            if parent_id is not None:
+                connection.execute(counter.table.update().where(pk == parent_id).values({counter: counter + delta}))
+
+                # The in memory parent, if any, is expired at the end of the flush
+                parent_key = orm.class_mapper(local_cls).identity_key_from_primary_key([parent_id])
+                orm.object_session(target).info.setdefault('expired_counters', set()).add(
+                    (parent_key, self.counter_cache)
+                )
+
+        @event.listens_for(target_cls, 'after_insert')
+        def after_insert(mapper, connection, target):
+            update_counter(connection, target, getattr(target, foreign_key.key), 1)
+
+        @event.listens_for(target_cls, 'before_update')
+        def before_update(mapper, connection, target):
+            history = orm.attributes.get_history(target, foreign_key.key)
+            if history.has_changes():
+                update_counter(connection, target, self.committed_value(mapper, connection, target, foreign_key), -1)
+                update_counter(connection, target, (history.added or [None])[0], 1)
+
+        @event.listens_for(target_cls, 'before_delete')
+        def before_delete(mapper, connection, target):
+            update_counter(connection, target, self.committed_value(mapper, connection, target, foreign_key), -1)
+
     def create_foreign_field(self, foreign_key_name, pk, target_cls, key):
         foreign_field_params = target_cls.get_params_of_field(foreign_key_name)
         foreign_key, foreign_field_params = self.create_foreign_key(pk, **foreign_field_params)
@@ -123,6 +339,9 @@ class OneToMany(FKRelationship):
         pk = list(local_cls.__table__.primary_key)[0]
         foreign_key, _ = self.create_foreign_field(target_rel_name, pk, target_cls, key)
 
+        if self.counter_cache:
+            self.create_counter_cache(local_cls, target_cls, pk, foreign_key)
+
         return False, local_cls.get_params_of_field(key) | {'primaryjoin': foreign_key == pk}
 
 
@@ -175,18 +394,22 @@ class ManyToMany(FKRelationship):
         table_kwargs=None,
         inverse=None,
         collection_class=None,
+        collection=None,
+        local_first=False,
+        without_rowid=False,
         **kw,
     ):
-        super().__init__(target, '', inverse, collection_class, **kw)
+        super().__init__(target, '', inverse, collection_class, collection, **kw)
 
         self.tablename = tablename
         self.local_colname = local_colname
         self.remote_colname = remote_colname
         self.table = table
-        self.table_kwargs = table_kwargs or {}
+        self.table_kwargs = dict(table_kwargs or {}, **({'sqlite_with_rowid': False} if without_rowid else {}))
+        self.local_first = local_first
 
     @staticmethod
-    def create_foreign_field_params(index=True, nullable=False, primary_key=True, **kw):
+    def create_foreign_field_params(index=None, nullable=False, primary_key=True, **kw):
         return {'index': index, 'nullable': nullable, 'primary_key': primary_key}, kw
 
     def _config(self, inverse_foreign_keys, local_cls, target_cls, key, target_rel_name):
@@ -217,14 +440,27 @@ class ManyToMany(FKRelationship):
         if inverse_foreign_keys:
             foreign_name1, foreign_name2 = foreign_name2, foreign_name1
 
+        fields = [
+            (foreign_name1, foreign_key1, foreign_field_params1),
+            (foreign_name2, foreign_key2, foreign_field_params2),
+        ]
+        if self.local_first:
+            fields.reverse()
+
+        # The composite primary key already indexes its leading column
+        (_, _, leading_params), (_, _, params) = fields
+        if leading_params['index'] is None:
+            leading_params['index'] = not leading_params['primary_key']
+        if params['index'] is None:
+            params['index'] = True
+
         table = (
             self.table
             if self.table is not None
             else Table(
                 tablename,
                 local_cls.metadata,
-                Field(foreign_name1, foreign_key1, **foreign_field_params1),
-                Field(foreign_name2, foreign_key2, **foreign_field_params2),
+                *[Field(name, foreign_key, **params) for name, foreign_key, params in fields],
                 keep_existing=True,
                 **self.table_kwargs,
             )
@@ -235,6 +471,14 @@ class ManyToMany(FKRelationship):
         return True, kw
 
 
+@event.listens_for(orm.Session, 'after_flush_postexec')
+def expire_counters(session, flush_context):
+    for parent_key, counter in session.info.pop('expired_counters', ()):
+        parent = session.identity_map.get(parent_key)
+        if parent is not None:
+            session.expire(parent, [counter])
+
+
 # -----------------------------------------------------------------------------
 
 
@@ -251,6 +495,7 @@ class EntityMeta(database.EntityMetaBase):
             meta.set_tablename(cls, **options)
 
             cls.__relationships_params__ = {}
+            cls.__statements__ = StatementsCache()
             for name, relationship in ns.items():
                 if isinstance(relationship, FKRelationship):
                     cls.set_params_of_field(name, relationship.relationship_kwargs)
@@ -269,11 +514,34 @@ class EntityMeta(database.EntityMetaBase):
 
     @staticmethod
     def update_ns(
-        entity_name, ns, metadata=None, session=None, shortname=False, auto_primarykey=True, auto_add=True, **options
+        entity_name,
+        ns,
+        metadata=None,
+        session=None,
+        shortname=False,
+        auto_primarykey=True,
+        auto_add=True,
+        default_lazy_collection=None,
+        default_lazy_scalar=None,
+        version_id=False,
+        defer_large=False,
+        defer_large_length=255,
+        defer_group=None,
+        **options,
     ):
         ns['metadata'] = metadata or database.metadata
         ns['session'] = session or database.session
-        ns['using_options'] = {'shortname': shortname, 'auto_primarykey': auto_primarykey, 'auto_add': auto_add}
+        ns['using_options'] = {
+            'shortname': shortname,
+            'auto_primarykey': auto_primarykey,
+            'auto_add': auto_add,
+            'default_lazy_collection': default_lazy_collection,
+            'default_lazy_scalar': default_lazy_scalar,
+            'version_id': version_id,
+            'defer_large': defer_large,
+            'defer_large_length': defer_large_length,
+            'defer_group': defer_group,
+        }
 
         if auto_primarykey:
             primary_key_name = auto_primarykey if isinstance(auto_primarykey, str) else 'id'
@@ -287,6 +555,24 @@ class EntityMeta(database.EntityMetaBase):
             else:
                 ns[primary_key_name] = Field(Integer, primary_key=True)
 
+        if version_id:
+            version_id_name = version_id if isinstance(version_id, str) else 'version_id'
+            if version_id_name not in ns:
+                ns[version_id_name] = Field(Integer, nullable=False)
+
+            ns['__mapper_args__'] = dict(ns.get('__mapper_args__', {}), version_id_col=ns[version_id_name])
+
+        if defer_large:
+            is_large = defer_large if callable(defer_large) else lambda field: is_large_field(field, defer_large_length)
+            for name, field in list(ns.items()):
+                if isinstance(field, Field) and not field.primary_key and not field.foreign_keys and is_large(field):
+                    ns[name] = orm.deferred(field, group=defer_group)
+
+        for relationship in list(ns.values()):
+            counter_cache = getattr(relationship, 'counter_cache', None)
+            if counter_cache and (counter_cache not in ns):
+                ns[counter_cache] = Field(Integer, nullable=False, default=0, server_default='0')
+
     @staticmethod
     def set_tablename(cls, tablename=None, shortname=False, **options):
         if not hasattr(cls, '__table__') and not hasattr(cls, '__tablename__'):
@@ -333,37 +619,304 @@ class _NagareEntity:
     def session_query(cls):
         return cls.session.query(cls)
 
+    @classmethod
+    def select(cls, *criterion):
+        """2.0 style ``select()`` statement of the entities."""
+        return select(cls).where(*criterion)
+
+    @classmethod
+    def scalars(cls, *criterion, **kw):
+        """Entities matching criteria, as a ``ScalarResult``.
+
+        In:
+          - ``criterion`` -- boolean criteria
+          - ``kw`` -- ``filter_by()`` criteria
+        """
+        return cls.session.scalars(cls.select(*criterion).filter_by(**kw)).unique()
+
     @classmethod
     def subquery(cls, name=None, with_labels=False, reduce_columns=False):
         return cls.query.subquery(name, with_labels, reduce_columns)
 
+    @classmethod
+    def undefer(cls, *fields):
+        """Query loading deferred fields (all the deferred fields by default)."""
+        fields = fields or [prop.class_attribute for prop in cls.__mapper__.column_attrs if prop.deferred]
+        return cls.session_query().options(*[orm.undefer(field) for field in fields])
+
+    @classmethod
+    def rows(cls, *columns_and_criteria, **kw):
+        """Named rows of columns, without creating any entity.
+
+        In:
+          - ``columns_and_criteria`` -- columns to select (all by default) and boolean criteria
+          - ``kw`` -- ``filter_by()`` criteria
+        """
+        columns, criteria = split_columns_and_criteria(cls, columns_and_criteria)
+        statement = select(*columns).where(*criteria).filter_by(**kw)
+
+        return cls.session.execute(statement, bind_arguments={'mapper': cls.__mapper__}).all()
+
+    @classmethod
+    def values(cls, *columns_and_criteria, **kw):
+        """Like ``rows()`` but with plain tuples, or plain values when only one column is selected."""
+        columns, criteria = split_columns_and_criteria(cls, columns_and_criteria)
+        statement = select(*columns).where(*criteria).filter_by(**kw)
+        result = cls.session.execute(statement, bind_arguments={'mapper': cls.__mapper__})
+
+        return result.scalars().all() if len(columns) == 1 else [tuple(row) for row in result]
+
+    @classmethod
+    def to_columns(cls, *columns_and_criteria, chunk_size=10000, **kw):
+        """Values of columns, fetched by chunks through a server side cursor.
+
+        The boolean, integer and float values are stored in NumPy arrays, if
+        NumPy is installed, or in ``array.array``. The other values, or a
+        column with NULL values, are stored in lists.
+
+        In:
+          - ``columns_and_criteria`` -- columns to select (all by default) and boolean criteria
+          - ``chunk_size`` -- number of rows fetched at once
+          - ``kw`` -- ``filter_by()`` criteria
+
+        Return:
+          - dictionary column name -> values
+        """
+        columns, criteria = split_columns_and_criteria(cls, columns_and_criteria)
+        query = select(*columns).where(*criteria).filter_by(**kw)
+        result = cls.session.execute(
+            query, execution_options={'yield_per': chunk_size}, bind_arguments={'mapper': cls.__mapper__}
+        )
+
+        typecodes = [array_typecode(column.type) for column in columns]
+        values = [array.array(typecode) if typecode else [] for typecode in typecodes]
+
+        for partition in result.partitions():
+            for i, column_values in enumerate(zip(*partition)):
+                column_values = list(column_values)
+                if isinstance(values[i], list):
+                    values[i].extend(column_values)
+                    continue
+
+                try:
+                    values[i].fromlist(column_values)
+                except TypeError:  # NULL values
+                    values[i] = values[i].tolist() + column_values
+
+        if numpy is not None:
+            values = [
+                numpy.frombuffer(column_values, dtype=bool if column_values.typecode == 'b' else column_values.typecode)
+                if isinstance(column_values, array.array)
+                else column_values
+                for column_values in values
+            ]
+
+        return dict(zip(result.keys(), values))
+
+    @classmethod
+    def _execute_where(cls, statement, synchronize_session, fields=None):
+        expire = synchronize_session == 'expire'
+        execution_options = {'synchronize_session': False if expire else synchronize_session}
+        result = cls.session.execute(statement, execution_options=execution_options)
+
+        if expire:
+            for entity in list(cls.session.identity_map.values()):
+                if isinstance(entity, cls):
+                    cls.session.expire(entity, fields)
+
+        return result.rowcount
+
+    @classmethod
+    def _counted_parents(cls, criteria, values=None):
+        """Parents whose ``counter_cache`` columns are changed by an update or a delete of children.
+
+        In:
+          - ``criteria`` -- boolean criteria of the children
+          - ``values`` -- new values of the updated children (``None`` for a delete)
+
+        Return:
+          - list of (counter column, parent primary key, foreign key, parent class, parent ids)
+        """
+        parents = []
+        for counter, pk, foreign_key, parent_cls in cls.metadata.info.get('counter_caches', ()):
+            if (foreign_key.table is not cls.__table__) or ((values is not None) and (foreign_key.key not in values)):
+                continue
+
+            ids = set(cls.values(getattr(cls, foreign_key.key), *criteria))
+            if values is not None:
+                new_id = values[foreign_key.key]
+                if isinstance(new_id, sql.ClauseElement) or hasattr(new_id, '__clause_element__'):
+                    raise ValueError('Counter cache "{}" not updatable with a SQL expression'.format(counter.key))
+
+                ids.add(new_id)
+
+            parents.append((counter, pk, foreign_key, parent_cls, ids - {None}))
+
+        return parents
+
+    @classmethod
+    def _update_counters(cls, parents):
+        for counter, pk, foreign_key, parent_cls, ids in parents:
+            if not ids:
+                continue
+
+            parent_mapper = orm.class_mapper(parent_cls)
+            count = select(func.count()).where(foreign_key == pk).scalar_subquery()
+            cls.session.execute(
+                update(counter.table).where(pk.in_(ids)).values({counter: count}),
+                bind_arguments={'mapper': parent_mapper},
+            )
+
+            for parent_id in ids:
+                parent = cls.session.identity_map.get(parent_mapper.identity_key_from_primary_key([parent_id]))
+                if parent is not None:
+                    cls.session.expire(parent, [counter.key])
+
+    @classmethod
+    def update_where(cls, *criteria, synchronize_session='auto', **values):
+        """Update the rows matching criteria with a single UPDATE.
+
+        The version of versioned entities is incremented and the ``counter_cache``
+        columns of the parents are recomputed when the children change of parent.
+
+        In:
+          - ``criteria`` -- boolean criteria
+          - ``synchronize_session`` -- ``'auto'``, ``'evaluate'``, ``'fetch'``, ``False`` or ``'expire'``
+            to only expire the updated fields of the entities in the session
+          - ``values`` -- new values of the fields
+
+        Return:
+          - number of updated rows
+        """
+        mapper = cls.__mapper__
+        if (mapper.version_id_col is not None) and (mapper.version_id_generator is not False):
+            version = mapper.get_property_by_column(mapper.version_id_col).key
+            values.setdefault(version, getattr(cls, version) + 1)
+
+        parents = cls._counted_parents(criteria, values)
+        nb = cls._execute_where(update(cls).where(*criteria).values(**values), synchronize_session, list(values))
+        cls._update_counters(parents)
+
+        return nb
+
+    @classmethod
+    def delete_where(cls, *criteria, synchronize_session='auto'):
+        """Delete the rows matching criteria with a single DELETE.
+
+        The ``counter_cache`` columns of the parents are recomputed.
+
+        In:
+          - ``criteria`` -- boolean criteria
+          - ``synchronize_session`` -- ``'auto'``, ``'evaluate'``, ``'fetch'``, ``False`` or ``'expire'``
+            to only expire the entities in the session
+
+        Return:
+          - number of deleted rows
+        """
+        parents = cls._counted_parents(criteria)
+        nb = cls._execute_where(delete(cls).where(*criteria), synchronize_session)
+        cls._update_counters(parents)
+
+        return nb
+
+    @classmethod
+    def _cached_statement(cls, helper, kw, build):
+        """Statement filtering on ``kw``, built once for each set of field names, and its parameters."""
+        columns = cls.__mapper__.column_attrs
+        # SQL expressions values are part of the statement, they can't be parameters
+        if not all(
+            (name in columns) and not (isinstance(value, sql.ClauseElement) or hasattr(value, '__clause_element__'))
+            for name, value in kw.items()
+        ):
+            return build(cls.select().filter_by(**kw)), {}
+
+        # A ``None`` value is compared with ``IS NULL``, not with a parameter
+        key = (helper,) + tuple(sorted((name, value is None) for name, value in kw.items()))
+        params = {'p_' + name: value for name, value in kw.items() if value is not None}
+
+        def build_statement():
+            criteria = {name: None if value is None else bindparam('p_' + name) for name, value in kw.items()}
+            return build(cls.select().filter_by(**criteria))
+
+        return cls.__statements__.get_statement(key, build_statement), params
+
     @classmethod
     def count(cls):
-        return cls.session_query().count()
+        statement, params = cls._cached_statement(
+            'count', {}, lambda statement: select(func.count()).select_from(statement.subquery())
+        )
+        return cls.session.scalar(statement, params)
 
     @classmethod
     def all(cls):
-        return cls.session_query().all()
+        return cls.scalars().all()
 
     @classmethod
     def first(cls):
-        return cls.session_query().first()
+        statement, params = cls._cached_statement('get_by', {}, lambda statement: statement.limit(1))
+        return cls.session.scalars(statement, params).unique().first()
 
     @classmethod
     def get(cls, ident):
         return cls.session.get(cls, ident)
 
+    @classmethod
+    def get_many(cls, idents, chunk_size=500):
+        """Entities of primary keys.
+
+        The entities already in the session are not fetched again, the others
+        are fetched with ``IN`` queries of ``chunk_size`` keys.
+
+        In:
+          - ``idents`` -- primary keys (tuples for composite primary keys)
+          - ``chunk_size`` -- max number of keys of a query
+
+        Return:
+          - list of the entities, in the ``idents`` order, with ``None`` for the missing ones
+        """
+        mapper = cls.__mapper__
+        primary_key = mapper.primary_key
+        # The keys are matched with the ones of the fetched entities, so they must have the same types
+        idents = [
+            tuple(coerce_key(column, value) for column, value in zip(primary_key, ident))
+            for ident in (ident if isinstance(ident, tuple) else (ident,) for ident in idents)
+        ]
+
+        entities = {}
+        missings = []
+        for ident in dict.fromkeys(idents):
+            entity = cls.session.identity_map.get(mapper.identity_key_from_primary_key(ident))
+            if (entity is None) or orm.attributes.instance_state(entity).expired:
+                missings.append(ident)
+            else:
+                entities[ident] = entity
+
+        for i in range(0, len(missings), chunk_size):
+            chunk = missings[i : i + chunk_size]
+            if len(primary_key) == 1:
+                criterion = primary_key[0].in_([ident[0] for ident in chunk])
+            else:
+                criterion = tuple_(*primary_key).in_(chunk)
+
+            for entity in cls.session.scalars(select(cls).where(criterion)):
+                entities[tuple(mapper.primary_key_from_instance(entity))] = entity
+
+        return [entities.get(ident) for ident in idents]
+
     @classmethod
     def get_by(cls, **kw):
-        return cls.session_query().filter_by(**kw).first()
+        statement, params = cls._cached_statement('get_by', kw, lambda statement: statement.limit(1))
+        return cls.session.scalars(statement, params).unique().first()
 
     @classmethod
     def single_by(cls, **kw):
-        return cls.session_query().filter_by(**kw).one_or_none()
+        statement, params = cls._cached_statement('filter_by', kw, lambda statement: statement)
+        return cls.session.scalars(statement, params).unique().one_or_none()
 
     @classmethod
     def one_by(cls, **kw):
-        return cls.session_query().filter_by(**kw).one()
+        statement, params = cls._cached_statement('filter_by', kw, lambda statement: statement)
+        return cls.session.scalars(statement, params).unique().one()
 
     @classmethod
     def filter(cls, *criterion):
@@ -375,7 +928,8 @@ class _NagareEntity:
 
     @classmethod
     def exists(cls, **kw):
-        return cls.session.query(cls.session_query().filter_by(**kw).exists()).scalar()
+        statement, params = cls._cached_statement('exists', kw, lambda statement: select(statement.exists()))
+        return cls.session.scalar(statement, params)
 
     @classmethod
     def join(cls, *tables):
@@ -62,7 +62,7 @@ def entity_setstate(entity, d):
         # Fetch a new and initialized SQLAlchemy from the database
         session = getattr(entity.__class__, 'session', database.session)
 
-        x = session.query(entity.__class__).get(key)
+        x = session.get(entity.__class__, key)
         session.expunge(x)
 
         # Copy its state to our entity
@@ -0,0 +1,99 @@
+# --
+# Copyright (c) 2008-2025 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+"""Pytest fixtures running each test in a transaction rolled back at teardown.
+
+The schema is created once per tests session. Then, for each test using the
+``database_session`` fixture, the database session is bound to a connection
+in an outer transaction and all the session transactions are SAVEPOINTs.
+
+Override the ``database_metadatas`` fixture to change the metadatas to create
+and set the ``nagare_database_uri`` ini option to change the database.
+"""
+
+import pytest
+from sqlalchemy import event
+
+from nagare.services import database
+
+
+def pytest_addoption(parser):
+    parser.addini('nagare_database_uri', 'database used by the `database_session` fixture', default='sqlite://')
+
+
+def _sqlite_savepoints(engine):
+    # pysqlite doesn't emit BEGIN itself and breaks the SAVEPOINTs
+    @event.listens_for(engine, 'connect')
+    def connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, 'begin')
+    def begin(connection):
+        connection.exec_driver_sql('BEGIN')
+
+
+@pytest.fixture(scope='session')
+def database_metadatas():
+    return [database.metadata]
+
+
+def _restore_engines(engines):
+    database.Session.metadatas.clear()
+    database.Session.metadatas.update(engines)
+
+
+@pytest.fixture(scope='session')
+def database_engines(request, database_metadatas):
+    uri = request.config.getini('nagare_database_uri')
+    previous_engines = dict(database.Session.metadatas)
+
+    engines = {}
+    for metadata in database_metadatas:
+        engine = database.configure_database(uri, metadata=metadata)
+        if engine.dialect.name == 'sqlite':
+            _sqlite_savepoints(engine)
+
+        metadata.create_all(engine)
+        engines[metadata] = engine
+
+    # The engines are only used through the connections of the ``database_session`` fixture
+    _restore_engines(previous_engines)
+
+    yield engines
+
+    for metadata, engine in engines.items():
+        metadata.drop_all(engine)
+        engine.dispose()
+
+
+@pytest.fixture
+def database_session(database_engines):
+    connections = {}
+    for metadata, engine in database_engines.items():
+        connection = connections[metadata] = engine.connect()
+        connection.begin()
+
+    session = database.session
+    join_transaction_mode = session.session_factory.kw.get('join_transaction_mode', 'conditional_savepoint')
+    previous_engines = dict(database.Session.metadatas)
+
+    session.remove()
+    session.configure(join_transaction_mode='create_savepoint')
+    database.Session.metadatas.update(connections)
+
+    try:
+        yield session
+    finally:
+        session.remove()
+        session.configure(join_transaction_mode=join_transaction_mode)
+        _restore_engines(previous_engines)
+
+        for connection in connections.values():
+            connection.rollback()
+            connection.close()
@@ -7,18 +7,45 @@
 # this distribution.
 # --
 
+import io
 import os
+import json
+import time
+import decimal
+import hashlib
+import sqlite3
+import datetime
+import tempfile
+import itertools
 import urllib.parse as urlparse
+from concurrent import futures
 
+import transaction
 import zope.sqlalchemy
-from sqlalchemy import MetaData, orm, event, engine_from_config
+from sqlalchemy import (
+    JSON,
+    ARRAY,
+    Engine,
+    MetaData,
+    exc,
+    orm,
+    func,
+    pool,
+    event,
+    schema,
+    select,
+    create_engine,
+    engine_from_config,
+)
 from sqlalchemy.ext import declarative
+from sqlalchemy.dialects import sqlite
 
 from nagare.server import reference
 from nagare.services import plugin
 from nagare.admin.alembic_commands import get_heads, drop_version, get_current_revision
 
-from .database_exceptions import InvalidVersion
+from . import database_retry, database_breaker, database_timeouts, database_profiling
+from .database_exceptions import StaleEntity, ReadOnlyError, InvalidVersion
 
 
 class Session(orm.Session):
@@ -26,8 +53,41 @@ class Session(orm.Session):
 
     def get_bind(self, mapper=None, **kw):
         metadata = get_metadata(mapper.class_) if mapper is not None else None
+        if metadata is None:
+            return super().get_bind(mapper, **kw)
 
-        return self.metadatas[metadata] if metadata is not None else super().get_bind(mapper, **kw)
+        engine = self.metadatas[metadata]
+        tenant = self.info.get('tenant')
+
+        return engine if (tenant is None) or not metadata.info.get('tenants') else get_tenant_engine(engine, tenant)
+
+    def flush(self, objects=None):
+        try:
+            super().flush(objects)
+        except orm.exc.StaleDataError as e:
+            if isinstance(e, StaleEntity):
+                raise
+
+            raise StaleEntity(*e.args) from e
+
+    def _connection_for_bind(self, engine, execution_options=None, **kw):
+        breaker = database_breaker.breakers.get(engine.pool) if isinstance(engine, Engine) else None
+
+        # Only the new connections are gated, not the ones already used by the transaction
+        transaction = self._transaction
+        if (breaker is None) or ((transaction is not None) and (engine in transaction._connections)):
+            return super()._connection_for_bind(engine, execution_options, **kw)
+
+        breaker.check(engine.url)
+        try:
+            connection = super()._connection_for_bind(engine, execution_options, **kw)
+        except (exc.TimeoutError, exc.DBAPIError):
+            breaker.failure()
+            raise
+
+        breaker.success()
+
+        return connection
 
 
 def get_metadata(cls):
@@ -45,6 +105,179 @@ def get_engine(metadata):
 session = orm.scoped_session(orm.sessionmaker(class_=Session, future=True))
 query = session.query
 metadata = MetaData()
+tenant_engines = {}
+
+
+def get_tenant_engine(engine, tenant):
+    """Return a copy of an engine, sharing its pool and statements cache, with its tables in the ``tenant`` schema."""
+    if not isinstance(engine, Engine):
+        return engine
+
+    tenant_engine = tenant_engines.get((engine, tenant))
+    if tenant_engine is None:
+        tenant_engine = tenant_engines[engine, tenant] = engine.execution_options(schema_translate_map={None: tenant})
+
+    return tenant_engine
+
+
+def set_tenant(tenant, session=session):
+    """Route the tenant aware databases of a session to the schema of a tenant.
+
+    The tenants share the identity map of the session, so the tenant can only
+    be changed in a session without transaction and without entities.
+
+    In:
+      - ``tenant`` -- the schema of the tenant (``None`` for the default schema)
+      - ``session`` -- the session or scoped session
+    """
+    session = session() if isinstance(session, orm.scoped_session) else session
+
+    if (tenant != session.info.get('tenant')) and (session.in_transaction() or len(session.identity_map)):
+        raise RuntimeError('Tenant changed in a session with a transaction or entities')
+
+    if tenant is None:
+        session.info.pop('tenant', None)
+    else:
+        session.info['tenant'] = tenant
+
+
+def end_request(session=session):
+    """Reset the tenant and read-only mode of a session, now or at the end of its transaction."""
+    session = session() if isinstance(session, orm.scoped_session) else session
+
+    if session.in_transaction():
+        session.info['end_request'] = True
+    else:
+        session.info.pop('tenant', None)
+        end_read_only(session, True)
+
+
+def _set_transaction_read_only(connection):
+    dialect = connection.dialect.name
+
+    if dialect in ('postgresql', 'mysql', 'mariadb'):
+        connection.exec_driver_sql('SET TRANSACTION READ ONLY')
+    elif dialect == 'sqlite':
+        # Not a transaction setting: the connection is restored at the end of the transaction or when checked in
+        connection.exec_driver_sql('PRAGMA query_only = ON')
+        connection.connection.info['query_only'] = True
+
+
+@event.listens_for(pool.Pool, 'checkin')
+def _end_query_only(dbapi_connection, connection_record):
+    if connection_record.info.pop('query_only', False) and (dbapi_connection is not None):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute('PRAGMA query_only = OFF')
+        finally:
+            cursor.close()
+
+
+def set_read_only(session=session):
+    """Make the current database transaction of a session read-only.
+
+    Autoflush and expire on commit are disabled and the session raises ``ReadOnlyError``
+    on writes. The connections begun afterwards are set read-only too (``SET TRANSACTION
+    READ ONLY`` on PostgreSQL and MySQL, ``PRAGMA query_only`` on SQLite). The session
+    is restored at the end of the transaction.
+
+    In:
+      - ``session`` -- the session or scoped session
+    """
+    session = session() if isinstance(session, orm.scoped_session) else session
+
+    if 'read_only' not in session.info:
+        session.info['read_only'] = (session.autoflush, session.expire_on_commit)
+        session.autoflush = session.expire_on_commit = False
+
+
+def end_read_only(session=session, force=False):
+    """Restore a read-only session, if not in a transaction."""
+    session = session() if isinstance(session, orm.scoped_session) else session
+
+    if ('read_only' in session.info) and (force or not session.in_transaction()):
+        session.autoflush, session.expire_on_commit = session.info.pop('read_only')
+
+
+@event.listens_for(Session, 'after_begin')
+def _begin_read_only(session, transaction, connection):
+    if 'read_only' in session.info:
+        _set_transaction_read_only(connection)
+        session.info.setdefault('read_only_connections', []).append(connection)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _end_read_only(session, transaction):
+    if transaction.parent is None:
+        # The connections still open, as the ones the session is bound to, are not checked in
+        for connection in session.info.pop('read_only_connections', ()):
+            if not (connection.closed or connection.invalidated):
+                _end_query_only(connection.connection.dbapi_connection, connection.connection)
+
+        end_read_only(session, True)
+
+        if session.info.pop('end_request', False):
+            session.info.pop('tenant', None)
+
+
+@event.listens_for(Session, 'before_flush')
+def _flush_read_only(session, flush_context, instances):
+    if ('read_only' in session.info) and (
+        session.new or session.deleted or any(session.is_modified(o) for o in session.dirty)
+    ):
+        raise ReadOnlyError('Read-only database session, changes not allowed')
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _execute_read_only(orm_execute_state):
+    if ('read_only' in orm_execute_state.session.info) and (
+        orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete
+    ):
+        raise ReadOnlyError('Read-only database session, statement not allowed')
+
+
+def _record_written_engines(session, flush_context, instances):
+    engines = session.info.setdefault('written_engines', set())
+    for o in itertools.chain(session.new, session.deleted, session.dirty):
+        if (o not in session.dirty) or session.is_modified(o):
+            engines.add(session.get_bind(orm.object_mapper(o)))
+
+
+def _record_written_engine(orm_execute_state):
+    mapper = orm_execute_state.bind_mapper
+    if (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete) and mapper:
+        orm_execute_state.session.info.setdefault('written_engines', set()).add(
+            orm_execute_state.session.get_bind(mapper)
+        )
+
+
+def _downgrade_twophases(session):
+    if session.twophase and not session.in_nested_transaction():
+        session.flush()
+        if len(session.info.get('written_engines', ())) < 2:
+            # The connections are committed without being prepared first
+            session.twophase = False
+            session.info['twophases_downgraded'] = True
+
+
+def _reset_twophases(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('written_engines', None)
+        if session.info.pop('twophases_downgraded', False):
+            session.twophase = True
+
+
+def register_adaptive_twophases(session):
+    """Only do two-phase commits when several engines were written during the transaction.
+
+    In:
+      - ``session`` -- the session, scoped session or sessionmaker configured with ``twophase=True``
+    """
+    if not event.contains(session, 'before_commit', _downgrade_twophases):
+        event.listen(session, 'before_flush', _record_written_engines)
+        event.listen(session, 'do_orm_execute', _record_written_engine)
+        event.listen(session, 'before_commit', _downgrade_twophases)
+        event.listen(session, 'after_transaction_end', _reset_twophases)
 
 
 def configure_database(
@@ -56,6 +289,10 @@ def configure_database(
     debug=False,
     json_serializer=None,
     json_deserializer=None,
+    tenants=False,
+    statement_timeout=None,
+    breaker_threshold=0,
+    breaker_reset=30,
     **config,
 ):
     if not isinstance(metadata, MetaData):
@@ -64,6 +301,8 @@ def configure_database(
     if name is not None:
         metadata.name = name
 
+    metadata.info['tenants'] = tenants
+
     for event_name in ('before_create', 'after_create', 'before_drop', 'after_drop'):
         event_callback = config.pop(event_name, None)
         if event_callback:
@@ -80,12 +319,164 @@ def configure_database(
 
     Session.metadatas[metadata] = engine = engine_from_config(config, '', echo=debug, url=uri, future=True)
 
+    if statement_timeout:
+        database_timeouts.set_statement_timeout(engine, statement_timeout)
+
+    if breaker_threshold:
+        database_breaker.breakers[engine.pool] = database_breaker.CircuitBreaker(breaker_threshold, breaker_reset)
+
     if autoremap:
         metadata.reflect(engine, only=autoremap_only)
 
     return engine
 
 
+def _end_batch(session, commit):
+    session.flush()
+    if commit:
+        transaction.commit()
+
+    session.expunge_all()
+
+
+def batched(iterable, size=1000, commit=False, session=session):
+    """Iterate over items, emptying the session every ``size`` items.
+
+    The session is flushed, the transaction optionally committed, then all
+    the entities are expunged from the session so memory stays bounded.
+
+    In:
+      - ``iterable`` -- the items, typically used to create entities
+      - ``size`` -- number of items of a batch
+      - ``commit`` -- commit the transaction after each batch?
+      - ``session`` -- the session
+    """
+    nb = 0
+    for nb, item in enumerate(iterable, 1):
+        yield item
+
+        if (nb % size) == 0:
+            _end_batch(session, commit)
+
+    if nb % size:
+        _end_batch(session, commit)
+
+
+def _constant_signature(const):
+    if hasattr(const, 'co_code'):
+        return b''.join(_code_signature(const))
+
+    # Deterministic form, whatever the ``PYTHONHASHSEED``
+    if isinstance(const, (set, frozenset)):
+        return b'{' + b','.join(sorted(map(_constant_signature, const))) + b'}'
+
+    if isinstance(const, tuple):
+        return b'(' + b','.join(map(_constant_signature, const)) + b')'
+
+    return repr(const).encode('utf-8')
+
+
+def _code_signature(code):
+    yield code.co_code
+    yield ','.join(code.co_names).encode('utf-8')  # Global names and attributes used
+    for const in code.co_consts:
+        yield _constant_signature(const)
+
+
+def get_template_key(metadata, populate):
+    """Hash of the schema of a metadata and of a populate function.
+
+    In:
+      - ``metadata`` -- the metadata
+      - ``populate`` -- the populate function
+
+    Return:
+      - the hexadecimal hash
+    """
+    h = hashlib.sha256()
+
+    dialect = sqlite.dialect()
+    for table in metadata.sorted_tables:
+        h.update(str(schema.CreateTable(table).compile(dialect=dialect)).encode('utf-8'))
+        for index in sorted(table.indexes, key=lambda index: index.name or ''):
+            h.update(str(schema.CreateIndex(index).compile(dialect=dialect)).encode('utf-8'))
+
+    h.update('{}:{}'.format(populate.__module__, populate.__qualname__).encode('utf-8'))
+    code = getattr(populate, '__code__', None)
+    if code is not None:
+        for signature in _code_signature(code):
+            h.update(signature)
+
+    return h.hexdigest()
+
+
+def get_sqlite_template(metadata, populate, directory=None, runner=None):
+    """Return a SQLite database with the tables of a metadata created and populated.
+
+    The template databases are cached in ``directory``, by hash of the metadata
+    and of the populate function.
+
+    In:
+      - ``metadata`` -- the metadata
+      - ``populate`` -- the populate function
+      - ``directory`` -- the templates cache, only accessible by the current user (default: in its home directory)
+      - ``runner`` -- function called with ``populate`` to populate the template (default: ``populate()``)
+
+    Return:
+      - the path of the template database
+    """
+    directory = directory or os.path.join(os.path.expanduser('~'), '.cache', 'nagare-database-templates')
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    # A template written by another user would be copied into all the cloned databases
+    if hasattr(os, 'getuid'):
+        stat = os.stat(directory)
+        if (stat.st_uid != os.getuid()) or (stat.st_mode & 0o022):
+            raise PermissionError("Templates directory '{}' is writable by other users".format(directory))
+
+    template = os.path.join(directory, get_template_key(metadata, populate) + '.sqlite')
+
+    if not os.path.exists(template):
+        fd, filename = tempfile.mkstemp('.tmp', dir=directory)
+        os.close(fd)
+
+        engine = Session.metadatas.get(metadata)
+        Session.metadatas[metadata] = template_engine = create_engine('sqlite:///' + filename)
+        try:
+            metadata.create_all(template_engine)
+            with transaction.manager:
+                (runner or (lambda populate: populate()))(populate)
+        except Exception:
+            os.remove(filename)
+            raise
+        finally:
+            if engine is None:
+                del Session.metadatas[metadata]
+            else:
+                Session.metadatas[metadata] = engine
+            template_engine.dispose()
+
+        # Atomic, so that concurrent workers always find a complete template
+        os.replace(filename, template)
+
+    return template
+
+
+def clone_sqlite_database(template, engine):
+    """Copy a SQLite database into the database of an engine, with the SQLite online backup API.
+
+    In:
+      - ``template`` -- path of the SQLite database to copy
+      - ``engine`` -- the SQLite engine, in memory or on disk
+    """
+    source = sqlite3.connect(template)
+    try:
+        with engine.connect() as connection:
+            source.backup(connection.connection.driver_connection)
+    finally:
+        source.close()
+
+
 class EntityMetaBase(declarative.DeclarativeMeta):
     pass
 
@@ -98,7 +489,170 @@ def default_populate(app):
     pass
 
 
-def configure_mappers(collections_class=set, inverse_foreign_keys=False):
+def _batches(rows, batch_size):
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            break
+
+        yield batch
+
+
+BOOLEANS = {'1': True, 't': True, 'true': True, 'yes': True, '0': False, 'f': False, 'false': False, 'no': False}
+
+
+def _parse_boolean(value):
+    boolean = BOOLEANS.get(value.strip().lower())
+    if boolean is None:
+        raise ValueError('Not a boolean value: {!r}'.format(value))
+
+    return boolean
+
+
+# Parsers of the string values read from a file, by Python type of the column
+STRING_PARSERS = {
+    int: int,
+    float: float,
+    bool: _parse_boolean,
+    decimal.Decimal: decimal.Decimal,
+    datetime.date: datetime.date.fromisoformat,
+    datetime.time: datetime.time.fromisoformat,
+    datetime.datetime: datetime.datetime.fromisoformat,
+    list: json.loads,
+}
+
+
+def _string_parser(column):
+    if isinstance(column.type, JSON):
+        return json.loads
+
+    try:
+        return STRING_PARSERS.get(column.type.python_type)
+    except NotImplementedError:
+        return None
+
+
+def _copy_array_value(value):
+    if value is None:
+        return 'NULL'
+
+    if isinstance(value, (list, tuple)):
+        return '{' + ','.join(map(_copy_array_value, value)) + '}'
+
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _copy_csv_value(value, is_array=False):
+    if value is None:
+        return ''
+
+    if isinstance(value, (dict, list, tuple)):
+        value = _copy_array_value(value) if is_array else json.dumps(value)
+
+    value = str(value)
+    return '"' + value.replace('"', '""') + '"'
+
+
+def _copy_load(connection, table, columns, batches):
+    preparer = connection.dialect.identifier_preparer
+    sql = 'COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+        preparer.format_table(table), ', '.join(preparer.quote(column) for column in columns)
+    )
+    arrays = [isinstance(table.c[column].type, ARRAY) for column in columns]
+
+    nb = 0
+    with connection.connection.driver_connection.cursor() as cursor:
+        for batch in batches:
+            data = ''.join(
+                ','.join(_copy_csv_value(value, is_array) for value, is_array in zip(row, arrays)) + '\n'
+                for row in batch
+            )
+
+            if hasattr(cursor, 'copy_expert'):  # psycopg2
+                cursor.copy_expert(sql, io.StringIO(data))
+            else:  # psycopg 3
+                with cursor.copy(sql) as copy:
+                    copy.write(data)
+
+            nb += len(batch)
+
+    return nb
+
+
+def _executemany_load(connection, table, columns, batches):
+    # The string values, as read from a file, are converted to the types of their columns
+    parsers = [_string_parser(table.c[column]) for column in columns]
+    if not any(parsers):
+        parsers = None
+
+    nb = 0
+    insert = table.insert()
+    for batch in batches:
+        if parsers is not None:
+            batch = [
+                [
+                    parser(value) if (parser is not None) and isinstance(value, str) else value
+                    for parser, value in zip(parsers, row)
+                ]
+                for row in batch
+            ]
+
+        connection.execute(insert, [dict(zip(columns, row)) for row in batch])
+        nb += len(batch)
+
+    return nb
+
+
+def _sqlite_load(connection, table, columns, batches):
+    pragmas = {'synchronous': 'OFF', 'temp_store': 'MEMORY', 'cache_size': '-65536'}
+    previous = {pragma: connection.exec_driver_sql('PRAGMA ' + pragma).scalar() for pragma in pragmas}
+
+    for pragma, value in pragmas.items():
+        connection.exec_driver_sql('PRAGMA {} = {}'.format(pragma, value))
+
+    try:
+        nb = _executemany_load(connection, table, columns, batches)
+        connection.commit()
+    finally:
+        connection.rollback()
+        for pragma, value in previous.items():
+            connection.exec_driver_sql('PRAGMA {} = {}'.format(pragma, value))
+        connection.commit()
+
+    return nb
+
+
+def bulk_load(engine, table, columns, rows, batch_size=10000):
+    """Insert rows into a table, using the fastest path of the engine dialect.
+
+    In:
+      - ``engine`` -- the engine the table is stored into
+      - ``table`` -- the ``Table`` to load
+      - ``columns`` -- the names of the columns to fill
+      - ``rows`` -- iterable of tuples of values, in ``columns`` order
+      - ``batch_size`` -- number of rows sent to the database at once
+
+    Return:
+      - the number of inserted rows
+    """
+    batches = _batches(rows, batch_size)
+    dialect = engine.dialect.name
+
+    if dialect == 'sqlite':
+        with engine.connect() as connection:
+            return _sqlite_load(connection, table, columns, batches)
+
+    with engine.begin() as connection:
+        if (dialect == 'postgresql') and (engine.dialect.driver in ('psycopg2', 'psycopg')):
+            return _copy_load(connection, table, columns, batches)
+
+        return _executemany_load(connection, table, columns, batches)
+
+
+def configure_mappers(
+    collections_class=set, inverse_foreign_keys=False, default_lazy_collection='select', default_lazy_scalar='select'
+):
     classes = []
 
     @event.listens_for(orm.Mapper, 'mapper_configured')
@@ -107,7 +661,9 @@ def configure_mappers(collections_class=set, inverse_foreign_keys=False):
         for key, value in list(cls.__dict__.items()):
             if isinstance(value, FKRelationshipBase):
                 delattr(cls, key)
-                value.config(cls, key, collections_class, inverse_foreign_keys)
+                value.config(
+                    cls, key, collections_class, inverse_foreign_keys, default_lazy_collection, default_lazy_scalar
+                )
 
     orm.configure_mappers()
 
@@ -121,6 +677,18 @@ class Database(plugin.Plugin):
     CONFIG_SPEC = plugin.Plugin.CONFIG_SPEC | {
         'collections_class': 'string(default=set)',
         'inverse_foreign_keys': 'boolean(default=False)',
+        'default_lazy_collection': (
+            'option("select", "joined", "selectin", "subquery", "immediate", "raise", "raise_on_sql", "noload",'
+            ' "write_only", "dynamic", default="select")'
+        ),
+        'read_only_methods': 'string_list(default=list())',  # HTTP methods run in read-only transactions
+        'tenant_resolver': 'string(default=None)',  # Function returning the tenant schema of a request
+        'time_budget': 'integer(default=None)',  # Max database time of a request, in milliseconds
+        'templates': 'string(default="$data/database_templates")',  # Cache of the SQLite templates databases
+        'default_lazy_scalar': (
+            'option("select", "joined", "selectin", "subquery", "immediate", "raise", "raise_on_sql", "noload",'
+            ' default="select")'
+        ),
         '__many__': {  # Database sub-sections
             '_database_section_': 'boolean(default=True)',
             'activated': 'boolean(default=True)',
@@ -133,6 +701,11 @@ class Database(plugin.Plugin):
             'autoremap_only': 'string_list(default=None)',
             'expire_on_commit': 'boolean(default=True)',
             'twophases': 'boolean(default=False)',
+            'twophases_adaptive': 'boolean(default=True)',  # Two-phase commit only when several databases written?
+            'tenants': 'boolean(default=False)',  # One schema per tenant, selected by the `tenant_resolver`?
+            'statement_timeout': 'integer(default=None)',  # Max duration of a statement, in milliseconds
+            'breaker_threshold': 'integer(default=0)',  # Fail fast after N connection failures in a row (0: never)
+            'breaker_reset': 'float(default=30)',  # Delay before a new connection try, in seconds
             'json_serializer': 'string(default=None)',
             'json_deserializer': 'string(default=None)',
             'metadata': 'string(default="nagare.database:metadata")',  # Database metadata: entities description
@@ -153,17 +726,52 @@ class Database(plugin.Plugin):
             'version_check': 'boolean(default=None)',
             'version_validation': 'boolean(default=True)',
         },
+        'retry': {  # Retry of the transactions run by the `retry()` method
+            'attempts': 'integer(default=1, min=1)',  # Max number of runs of a transaction
+            'backoff': 'float(default=0.05)',  # Delay before the first retry, in seconds, doubled at each retry
+            'max_backoff': 'float(default=2)',
+            'jitter': 'boolean(default=True)',  # Randomize the delays?
+        },
+        'profiling': {
+            'activated': 'boolean(default=False)',  # Log the database activity of each request?
+            'server_timing': 'boolean(default=None)',  # Add a `Server-Timing` header (default: in development mode)
+        },
         'ide': {'_database_section_': 'boolean(default=False)'},
         'cli': {'_database_section_': 'boolean(default=False)'},
     }
 
-    def __init__(self, name, dist, collections_class, inverse_foreign_keys, upgrade, reloader_service=None, **configs):
+    def __init__(
+        self,
+        name,
+        dist,
+        collections_class,
+        inverse_foreign_keys,
+        default_lazy_collection,
+        default_lazy_scalar,
+        read_only_methods,
+        tenant_resolver,
+        time_budget,
+        templates,
+        upgrade,
+        retry,
+        profiling,
+        reloader_service=None,
+        **configs,
+    ):
         super().__init__(
             name,
             dist,
             collections_class=collections_class,
             inverse_foreign_keys=inverse_foreign_keys,
+            default_lazy_collection=default_lazy_collection,
+            default_lazy_scalar=default_lazy_scalar,
+            read_only_methods=read_only_methods,
+            tenant_resolver=tenant_resolver,
+            time_budget=time_budget,
+            templates=templates,
             upgrade=upgrade.copy(),
+            retry=retry,
+            profiling=profiling,
             **configs,
         )
 
@@ -171,16 +779,29 @@ class Database(plugin.Plugin):
             reference.load_object(collections_class)[0] if ':' in collections_class else eval(collections_class)
         )
         self.inverse_foreign_keys = inverse_foreign_keys
+        self.default_lazy_collection = default_lazy_collection
+        self.default_lazy_scalar = default_lazy_scalar
+        self.read_only_methods = {method.upper() for method in read_only_methods}
+        self.tenant_resolver = reference.load_object(tenant_resolver)[0] if tenant_resolver else None
+        self.time_budget = time_budget
+        self.templates = templates
+        self.retry_policy = database_retry.RetryPolicy(**retry)
         version_check = upgrade.pop('version_check')
         self.version_check = (reloader_service is None) if version_check is None else version_check
         self.version_validation = upgrade.pop('version_validation')
         self.alembic_config = {k: v for k, v in upgrade.items() if v is not None}
+        self.profiling = profiling['activated']
+        server_timing = profiling['server_timing']
+        if server_timing is None:
+            server_timing = reloader_service is not None
+        self.server_timing = self.profiling and server_timing
         self.configs = configs
 
         self.location = (
             os.path.join(dist.editable_project_location, 'src') if dist.editable_project_location else dist.location
         )
         self.populates = {}
+        self.sessions = set()
 
     get_metadata = staticmethod(get_metadata)
     get_engine = staticmethod(get_engine)
@@ -194,13 +815,17 @@ class Database(plugin.Plugin):
         return {'session': session}
 
     @staticmethod
-    def _configure_session(session, autoflush, autocommit, expire_on_commit, twophases, **engine_config):
+    def _configure_session(
+        session, autoflush, autocommit, expire_on_commit, twophases, twophases_adaptive, **engine_config
+    ):
         session = reference.load_object(session)[0]
         session.configure(
             autoflush=autoflush, autocommit=autocommit, expire_on_commit=expire_on_commit, twophase=twophases
         )
 
         zope.sqlalchemy.register(session)
+        if twophases and twophases_adaptive:
+            register_adaptive_twophases(session)
 
         return engine_config
 
@@ -209,11 +834,76 @@ class Database(plugin.Plugin):
             if isinstance(config, dict) and config.pop('_database_section_', False) and config.pop('activated'):
                 populate = config.pop('populate')
                 self.populates[name] = reference.load_object(populate)[0]
+                self.sessions.add(reference.load_object(config['session'])[0])
 
                 engine_config = self._configure_session(**config)
                 configure_database(name=name, **engine_config)
 
-        configure_mappers(self.collections_class, self.inverse_foreign_keys)
+        configure_mappers(
+            self.collections_class, self.inverse_foreign_keys, self.default_lazy_collection, self.default_lazy_scalar
+        )
+
+        if self.profiling:
+            database_profiling.profile_orm()
+            for engine in Session.metadatas.values():
+                database_profiling.profile_engine(engine)
+
+        if self.time_budget:
+            for engine in Session.metadatas.values():
+                database_timeouts.budget_engine(engine)
+
+    set_read_only = staticmethod(set_read_only)
+    set_tenant = staticmethod(set_tenant)
+    batched = staticmethod(batched)
+
+    def handle_request(self, chain, **params):
+        request = params.get('request')
+        budget = database_timeouts.Budget(self.time_budget) if self.time_budget else None
+        token = database_timeouts.current_budget.set(budget)
+        try:
+            if request is not None:
+                read_only = request.method in self.read_only_methods
+                tenant = self.tenant_resolver(request) if self.tenant_resolver is not None else None
+
+                for db_session in self.sessions:
+                    if read_only:
+                        set_read_only(db_session)
+
+                    if self.tenant_resolver is not None:
+                        set_tenant(tenant, db_session)
+
+            return self.profile_request(chain, **params) if self.profiling else chain.next(**params)
+        finally:
+            database_timeouts.current_budget.reset(token)
+            for db_session in self.sessions:
+                end_request(db_session)
+
+    def retry(self, f, *args, **kw):
+        """Run ``f(*args, **kw)`` in a transaction, again if it fails on a deadlock or a serialization failure.
+
+        Each attempt begins a new zope transaction, which would abort the current
+        one: so ``retry()`` can't be called while a database session is in a transaction.
+        """
+        if any(session.in_transaction() for session in self.sessions):
+            raise RuntimeError('retry() called in a transaction, its pending changes would be lost')
+
+        return self.retry_policy(f, *args, **kw)
+
+    def profile_request(self, chain, **params):
+        profile = database_profiling.Profile()
+        token = database_profiling.current_profile.set(profile)
+        try:
+            response = chain.next(**params)
+        finally:
+            database_profiling.current_profile.reset(token)
+
+            engine_names = {engine: getattr(metadata, 'name', None) for metadata, engine in Session.metadatas.items()}
+            self.logger.info(profile.to_log(engine_names), extra={'database_profile': profile.to_dict(engine_names)})
+
+        if self.server_timing and hasattr(response, 'headers'):
+            response.headers.add('Server-Timing', profile.to_server_timing())
+
+        return response
 
     def handle_serve(self, app):
         for metadata, engine in Session.metadatas.items():
@@ -235,19 +925,69 @@ class Database(plugin.Plugin):
                         else:
                             self.logger.error(msg)
 
-    def create_all(self, db):
-        for metadata in self.metadatas:
-            if (db is None) or (db == metadata.name):
-                engine = self.get_engine(metadata)
-                metadata.create_all(engine)
+    def for_all(self, db, f, jobs=1):
+        """Call ``f(metadata, engine)`` for each database, in ``jobs`` parallel threads.
 
-    def drop_all(self, db):
-        for metadata in self.metadatas:
-            if (db is None) or (db == metadata.name):
-                engine = self.get_engine(metadata)
-                drop_version(engine)
-                metadata.drop_all(engine)
+        Return:
+          - dictionary database name -> duration of the call, in seconds
+        """
+
+        def timed(metadata):
+            start = time.perf_counter()
+            f(metadata, self.get_engine(metadata))
+
+            return metadata.name, time.perf_counter() - start
+
+        metadatas = [metadata for metadata in self.metadatas if (db is None) or (db == metadata.name)]
+        if (jobs <= 1) or (len(metadatas) <= 1):
+            return dict(map(timed, metadatas))
+
+        with futures.ThreadPoolExecutor(jobs) as executor:
+            return dict(executor.map(timed, metadatas))
+
+    @staticmethod
+    def _create_all(metadata, engine):
+        metadata.create_all(engine)
+
+    @staticmethod
+    def _drop_all(metadata, engine):
+        drop_version(engine)
+        metadata.drop_all(engine)
+
+    def create_all(self, db, jobs=1):
+        return self.for_all(db, self._create_all, jobs)
+
+    def drop_all(self, db, jobs=1):
+        return self.for_all(db, self._drop_all, jobs)
+
+    def bulk_load(self, table, columns, rows, batch_size=10000):
+        return bulk_load(self.get_engine(table.metadata), table, columns, rows, batch_size)
 
     def populate_all(self, db, app, services_service):
         for db in [db] if db is not None else self.populates:
             services_service(self.populates[db], app)
+
+    def rebuild_counters(self, db):
+        """Recompute all the ``counter_cache`` columns from the children tables."""
+        for metadata in self.metadatas:
+            if (db is None) or (db == metadata.name):
+                with self.get_engine(metadata).begin() as connection:
+                    for counter, pk, foreign_key, _ in metadata.info.get('counter_caches', ()):
+                        count = select(func.count()).where(foreign_key == pk).scalar_subquery()
+                        connection.execute(counter.table.update().values({counter: count}))
+
+    def clone_all(self, db, app, services_service, directory=None):
+        """Create and populate the SQLite databases by copying their cached templates."""
+        for metadata in self.metadatas:
+            if ((db is None) or (db == metadata.name)) and (metadata.name in self.populates):
+                engine = self.get_engine(metadata)
+                if engine.dialect.name != 'sqlite':
+                    raise ValueError("Database '{}' is not a SQLite database".format(metadata.name))
+
+                template = get_sqlite_template(
+                    metadata,
+                    self.populates[metadata.name],
+                    directory or self.templates,
+                    lambda populate: services_service(populate, app),
+                )
+                clone_sqlite_database(template, engine)
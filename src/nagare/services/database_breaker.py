@@ -0,0 +1,62 @@
+# --
+# Copyright (c) 2008-2025 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+import time
+import threading
+
+from .database_exceptions import DatabaseUnavailable
+
+# Circuit breakers, by engine pool (shared by the tenant engines)
+breakers = {}
+
+
+class CircuitBreaker:
+    """Fail fast when a database can't be connected to.
+
+    The breaker opens after ``threshold`` consecutive connection failures. Then
+    every ``reset_timeout`` seconds, one connection is tried again: its success
+    closes the breaker, its failure keeps it open.
+    """
+
+    def __init__(self, threshold, reset_timeout, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+
+        return 'open' if (self.clock() - self.opened_at) < self.reset_timeout else 'half-open'
+
+    def check(self, url):
+        if self.opened_at is not None:
+            with self.lock:
+                if (self.opened_at is not None) and (self.clock() - self.opened_at) < self.reset_timeout:
+                    raise DatabaseUnavailable('Database {} unavailable'.format(url.render_as_string()))
+
+                # Half-open: let this connection probe the database, the others still fail fast
+                self.opened_at = self.clock() if self.opened_at is not None else None
+
+    def success(self):
+        if self.failures:
+            with self.lock:
+                self.failures = 0
+                self.opened_at = None
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = self.clock()
@@ -7,6 +7,24 @@
 # this distribution.
 # --
 
+from sqlalchemy import orm
+
 
 class InvalidVersion(ValueError):
     """Invalid database version."""
+
+
+class ReadOnlyError(RuntimeError):
+    """Write in a read-only database session."""
+
+
+class DatabaseTimeout(TimeoutError):
+    """Statement timeout or database time budget of the request exhausted."""
+
+
+class DatabaseUnavailable(RuntimeError):
+    """Circuit breaker of a database open."""
+
+
+class StaleEntity(orm.exc.StaleDataError):
+    """Entity updated or deleted by a concurrent transaction."""
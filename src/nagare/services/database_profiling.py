@@ -0,0 +1,140 @@
+# --
+# Copyright (c) 2008-2025 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+import time
+import contextvars
+
+from sqlalchemy import orm, event
+from sqlalchemy.engine import cursor as engine_cursor
+
+current_profile = contextvars.ContextVar('database_profile', default=None)
+
+
+class Profile:
+    """Database activity during a request."""
+
+    def __init__(self):
+        self.statements = 0
+        self.db_time = 0.0
+        self.flushes = 0
+        self.flush_time = 0.0
+        self.fetched_rows = 0
+        self.affected_rows = 0
+        self.loaded = 0
+        self.engines = set()
+
+    def to_dict(self, engine_names=None):
+        engine_names = engine_names or {}
+
+        return {
+            'statements': self.statements,
+            'db_time_ms': round(self.db_time * 1000, 3),
+            'flushes': self.flushes,
+            'flush_time_ms': round(self.flush_time * 1000, 3),
+            'fetched_rows': self.fetched_rows,
+            'affected_rows': self.affected_rows,
+            'loaded': self.loaded,
+            'engines': sorted(engine_names.get(engine) or str(engine.url) for engine in self.engines),
+        }
+
+    def to_log(self, engine_names=None):
+        profile = self.to_dict(engine_names)
+        profile['engines'] = ','.join(profile['engines']) or '-'
+
+        return ' '.join('{}={}'.format(k, v) for k, v in profile.items())
+
+    def to_server_timing(self):
+        return 'db;dur={:.3f};desc="{} statements", flush;dur={:.3f};desc="{} flushes"'.format(
+            self.db_time * 1000, self.statements, self.flush_time * 1000, self.flushes
+        )
+
+
+class CountingFetchStrategy(engine_cursor.CursorFetchStrategy):
+    """Default fetch strategy of the results, counting the fetched rows."""
+
+    __slots__ = ('profile',)
+
+    def __init__(self, profile):
+        self.profile = profile
+
+    def fetchone(self, result, dbapi_cursor, hard_close=False):
+        row = super().fetchone(result, dbapi_cursor, hard_close)
+        if row is not None:
+            self.profile.fetched_rows += 1
+
+        return row
+
+    def fetchmany(self, result, dbapi_cursor, size=None):
+        rows = super().fetchmany(result, dbapi_cursor, size)
+        self.profile.fetched_rows += len(rows or ())
+
+        return rows
+
+    def fetchall(self, result, dbapi_cursor):
+        rows = super().fetchall(result, dbapi_cursor)
+        self.profile.fetched_rows += len(rows or ())
+
+        return rows
+
+
+def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    if current_profile.get() is not None:
+        connection.info.setdefault('profile_start', []).append(time.perf_counter())
+
+
+def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    profile = current_profile.get()
+    if (profile is not None) and connection.info.get('profile_start'):
+        profile.db_time += time.perf_counter() - connection.info['profile_start'].pop()
+        profile.statements += 1
+        profile.engines.add(connection.engine)
+
+        if context is not None:
+            # Rows inserted, updated or deleted
+            if (context.isinsert or context.isupdate or context.isdelete) and (cursor.rowcount > 0):
+                profile.affected_rows += cursor.rowcount
+
+            # Rows fetched, by the ORM or not. The streamed results keep their buffered strategy
+            options = context.execution_options
+            if (context.cursor_fetch_strategy is engine_cursor._DEFAULT_FETCH) and not (
+                options.get('stream_results') or options.get('yield_per')
+            ):
+                context.cursor_fetch_strategy = CountingFetchStrategy(profile)
+
+
+def before_flush(session, flush_context, instances):
+    if current_profile.get() is not None:
+        session.info['profile_flush_start'] = time.perf_counter()
+
+
+def after_flush_postexec(session, flush_context):
+    profile = current_profile.get()
+    start = session.info.pop('profile_flush_start', None)
+    if (profile is not None) and (start is not None):
+        profile.flush_time += time.perf_counter() - start
+        profile.flushes += 1
+
+
+def loaded(target, context):
+    profile = current_profile.get()
+    if profile is not None:
+        profile.loaded += 1
+
+
+def profile_engine(engine):
+    if not event.contains(engine, 'before_cursor_execute', before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+
+def profile_orm():
+    if not event.contains(orm.Session, 'before_flush', before_flush):
+        event.listen(orm.Session, 'before_flush', before_flush)
+        event.listen(orm.Session, 'after_flush_postexec', after_flush_postexec)
+        event.listen(orm.Mapper, 'load', loaded)
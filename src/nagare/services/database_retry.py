@@ -0,0 +1,74 @@
+# --
+# Copyright (c) 2008-2025 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+import time
+import random
+
+import transaction
+from sqlalchemy import exc
+
+RETRIABLE_SQLSTATES = {'40001', '40P01'}  # PostgreSQL serialization failure and deadlock
+RETRIABLE_ERRNOS = {1213, 1205}  # MySQL / MariaDB deadlock and lock wait timeout
+RETRIABLE_SQLITE_ERRORS = ('database is locked', 'database table is locked')
+
+
+def is_retriable(error):
+    """Can the transaction which raised an error be run again?"""
+    # Not the ``StaleDataError`` of the optimistic locking: running the transaction again would overwrite a conflict
+    if isinstance(error, transaction.interfaces.TransientError):
+        return True
+
+    if not isinstance(error, exc.DBAPIError):
+        return False
+
+    error = error.orig
+    if getattr(error, 'pgcode', getattr(error, 'sqlstate', None)) in RETRIABLE_SQLSTATES:
+        return True
+
+    if type(error).__module__.startswith('sqlite3'):
+        return str(error) in RETRIABLE_SQLITE_ERRORS
+
+    return bool(error.args) and (error.args[0] in RETRIABLE_ERRNOS)
+
+
+class RetryPolicy:
+    """Run a unit of work in a transaction, again on deadlocks and serialization failures."""
+
+    def __init__(self, attempts=1, backoff=0.05, max_backoff=2.0, jitter=True, sleep=time.sleep):
+        """Initialization.
+
+        In:
+          - ``attempts`` -- max number of runs
+          - ``backoff`` -- delay before the first retry, in seconds, doubled at each retry
+          - ``max_backoff`` -- max delay between two runs, in seconds
+          - ``jitter`` -- randomize the delays?
+        """
+        if attempts < 1:
+            raise ValueError('Invalid number of attempts {}, must be at least 1'.format(attempts))
+
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.sleep = sleep
+
+    def delay(self, attempt):
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        return random.uniform(0, delay) if self.jitter else delay  # noqa: S311
+
+    def __call__(self, f, *args, **kw):
+        for attempt in range(1, self.attempts + 1):
+            try:
+                with transaction.manager:
+                    return f(*args, **kw)
+            except Exception as e:
+                if (attempt == self.attempts) or not is_retriable(e):
+                    raise
+
+            self.sleep(self.delay(attempt))
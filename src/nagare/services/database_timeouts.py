@@ -0,0 +1,147 @@
+# --
+# Copyright (c) 2008-2025 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+import time
+import contextvars
+
+from sqlalchemy import event
+
+from .database_exceptions import DatabaseTimeout
+
+# Remaining database time of the current request, in seconds
+current_budget = contextvars.ContextVar('database_time_budget', default=None)
+
+TIMEOUT_ERRORS = {
+    'postgresql': {'57014'},  # query_canceled
+    'mysql': {3024, 1969},  # MySQL ER_QUERY_TIMEOUT, MariaDB ER_STATEMENT_TIMEOUT
+    'mariadb': {3024, 1969},
+}
+
+
+class Budget:
+    """Database time left to a request."""
+
+    def __init__(self, timeout):
+        self.remaining = timeout / 1000
+
+    def check(self):
+        if self.remaining <= 0:
+            raise DatabaseTimeout('Database time budget of the request exhausted')
+
+
+def _set_postgresql_timeout(dbapi_connection, timeout):
+    # Outside of a transaction, else the setting is undone by the first rollback
+    autocommit = dbapi_connection.autocommit
+    dbapi_connection.autocommit = True
+    try:
+        cursor = dbapi_connection.cursor()
+        cursor.execute('SET statement_timeout = %d' % timeout)
+        cursor.close()
+    finally:
+        dbapi_connection.autocommit = autocommit
+
+
+def _set_mysql_timeout(dbapi_connection, timeout, is_mariadb):
+    cursor = dbapi_connection.cursor()
+    if is_mariadb:
+        cursor.execute('SET SESSION max_statement_time = %s' % (timeout / 1000))  # In seconds, with decimals
+    else:
+        cursor.execute('SET SESSION max_execution_time = %d' % timeout)
+    cursor.close()
+
+
+def _set_sqlite_timeout(dbapi_connection, connection_record):
+    # The deadline of the running statement is set by ``_start_sqlite_statement()``
+    def progress():
+        deadline = connection_record.info.get('statement_deadline')
+        return (deadline is not None) and (time.monotonic() > deadline)
+
+    dbapi_connection.set_progress_handler(progress, 1000)
+
+
+def _start_sqlite_statement(connection, cursor, statement, parameters, context, executemany):
+    budget = current_budget.get()
+    timeout = connection.info['statement_timeout']
+    if budget is not None:
+        timeout = min(timeout, budget.remaining)
+
+    connection.info['statement_deadline'] = time.monotonic() + timeout
+
+
+def _end_sqlite_statement(connection, cursor, statement, parameters, context, executemany):
+    connection.info.pop('statement_deadline', None)
+
+
+def _timeout_error(context):
+    exception = context.original_exception
+    dialect = context.dialect.name
+
+    if dialect == 'sqlite':
+        is_timeout = str(exception) == 'interrupted'
+    elif dialect == 'postgresql':
+        is_timeout = getattr(exception, 'pgcode', getattr(exception, 'sqlstate', None)) in TIMEOUT_ERRORS[dialect]
+    else:
+        errno = exception.args[0] if exception.args else None
+        is_timeout = errno in TIMEOUT_ERRORS.get(dialect, ())
+
+    return DatabaseTimeout(str(exception)) if is_timeout else None
+
+
+def set_statement_timeout(engine, timeout):
+    """Cancel the statements running longer than a timeout.
+
+    In:
+      - ``engine`` -- the engine
+      - ``timeout`` -- the statements timeout, in milliseconds
+    """
+    dialect = engine.dialect.name
+
+    @event.listens_for(engine, 'connect')
+    def connect(dbapi_connection, connection_record):
+        if dialect == 'postgresql':
+            _set_postgresql_timeout(dbapi_connection, timeout)
+        elif dialect in ('mysql', 'mariadb'):
+            # The MySQL drivers connected to a MariaDB server are only detected at the first connection
+            _set_mysql_timeout(dbapi_connection, timeout, engine.dialect.is_mariadb)
+        elif dialect == 'sqlite':
+            connection_record.info['statement_timeout'] = timeout / 1000
+            _set_sqlite_timeout(dbapi_connection, connection_record)
+
+    if dialect == 'sqlite':
+        event.listen(engine, 'before_cursor_execute', _start_sqlite_statement)
+        event.listen(engine, 'after_cursor_execute', _end_sqlite_statement)
+
+    event.listen(engine, 'handle_error', _timeout_error, retval=True)
+
+
+def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    budget = current_budget.get()
+    if budget is not None:
+        budget.check()
+        connection.info['budget_start'] = time.perf_counter()
+
+
+def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    budget = current_budget.get()
+    start = connection.info.pop('budget_start', None)
+    if (budget is not None) and (start is not None):
+        budget.remaining -= time.perf_counter() - start
+
+
+def handle_error(context):
+    # The failed statements, i.e. the cancelled ones, are charged too
+    if context.connection is not None:
+        after_cursor_execute(context.connection, None, None, None, None, None)
+
+
+def budget_engine(engine):
+    if not event.contains(engine, 'before_cursor_execute', before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+        event.listen(engine, 'handle_error', handle_error)
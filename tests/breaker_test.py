@@ -0,0 +1,95 @@
+# --
+# Copyright (c) 2008-2025 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+import pytest
+from sqlalchemy import Text, MetaData, exc
+
+from nagare.database import Field, Entity, DatabaseUnavailable, session, configure_mappers, configure_database
+from nagare.services.database_breaker import breakers
+
+unavailable_metadata = MetaData()
+available_metadata = MetaData()
+other_metadata = MetaData()
+
+
+class Account7(Entity):
+    using_options = {'metadata': unavailable_metadata}
+
+    name = Field(Text)
+
+
+class Account7b(Entity):
+    using_options = {'metadata': available_metadata}
+
+    name = Field(Text)
+
+
+class Account7c(Entity):
+    using_options = {'metadata': other_metadata}
+
+    name = Field(Text)
+
+
+configure_mappers(list)
+
+engine = configure_database(
+    'sqlite:////nonexistent/database.db', metadata=unavailable_metadata, breaker_threshold=2, breaker_reset=60
+)
+
+available_engine = configure_database('sqlite://', metadata=available_metadata, breaker_threshold=1)
+other_engine = configure_database('sqlite://', metadata=other_metadata)
+available_metadata.create_all(available_engine)
+other_metadata.create_all(other_engine)
+
+
+def test_breaker():
+    breaker = breakers[engine.pool]
+    now = [0]
+    breaker.clock = lambda: now[0]
+
+    for _ in range(2):
+        with pytest.raises(exc.OperationalError):
+            Account7.all()
+        session.rollback()
+
+    assert breaker.state == 'open'
+    with pytest.raises(DatabaseUnavailable):
+        Account7.all()
+    session.rollback()
+
+    now[0] = 61
+    assert breaker.state == 'half-open'
+    with pytest.raises(exc.OperationalError):
+        Account7.all()
+    session.rollback()
+
+    assert breaker.state == 'open'
+    with pytest.raises(DatabaseUnavailable):
+        Account7.all()
+    session.rollback()
+
+
+def test_breaker_in_transaction():
+    breaker = breakers[available_engine.pool]
+    assert other_engine.pool not in breakers
+
+    assert Account7b.all() == []
+
+    # Opened by another request: the transaction keeps its connection
+    breaker.failure()
+    assert breaker.state == 'open'
+    assert Account7b.all() == []
+    assert Account7c.all() == []
+    session.rollback()
+
+    with pytest.raises(DatabaseUnavailable):
+        Account7b.all()
+    session.rollback()
+
+    breaker.success()
@@ -0,0 +1,119 @@
+# --
+# Copyright (c) 2008-2025 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+import io
+import datetime
+
+from sqlalchemy import JSON, Date, Table, Column, Boolean, Integer, Unicode, DateTime, MetaData, select, create_engine
+
+from nagare.services.database import bulk_load, _copy_csv_value
+from nagare.admin.database_commands import Dump, Load
+
+bulk_metadata = MetaData()
+measures = Table(
+    'measures',
+    bulk_metadata,
+    Column('id', Integer, primary_key=True),
+    Column('label', Unicode(20)),
+    Column('value', Integer),
+)
+events = Table(
+    'events',
+    bulk_metadata,
+    Column('id', Integer, primary_key=True),
+    Column('active', Boolean),
+    Column('day', Date),
+    Column('at', DateTime),
+    Column('data', JSON),
+)
+
+
+def test_sqlite_load(tmp_path):
+    engine = create_engine('sqlite:///' + str(tmp_path / 'bulk.db'))
+    bulk_metadata.create_all(engine)
+
+    rows = ((i, 'label%d' % i, i * 2) for i in range(25000))
+    assert bulk_load(engine, measures, ['id', 'label', 'value'], rows, batch_size=1000) == 25000
+
+    with engine.connect() as connection:
+        assert connection.execute(select(measures.c.value).where(measures.c.id == 12345)).scalar() == 24690
+        assert len(connection.execute(select(measures)).all()) == 25000
+
+        # The pragmas are restored
+        assert connection.exec_driver_sql('PRAGMA synchronous').scalar() == 2
+
+    engine.dispose()
+
+
+def test_read_csv():
+    columns, rows = Load.read_csv(io.StringIO('id,label\n1,\n2,two\n'), None)
+    assert columns == ['id', 'label']
+    assert list(rows) == [['1', None], ['2', 'two']]
+
+    columns, rows = Load.read_csv(io.StringIO('1,\n2,\\N\n'), ['id', 'label'], '\\N')
+    assert columns == ['id', 'label']
+    assert list(rows) == [['1', ''], ['2', None]]
+
+
+def test_typed_load(tmp_path):
+    engine = create_engine('sqlite:///' + str(tmp_path / 'typed.db'))
+    bulk_metadata.create_all(engine)
+
+    data = 'id,active,day,at,data\n1,1,2025-03-01,2025-03-01 12:30:00,"{""a"": 1}"\n2,false,,,\n'
+    columns, rows = Load.read_csv(io.StringIO(data), None)
+    assert bulk_load(engine, events, columns, rows) == 2
+
+    columns, rows = Load.read_jsonl(io.StringIO('{"id": 3, "active": true, "day": "2025-03-02", "data": [1]}\n'), None)
+    assert bulk_load(engine, events, columns, rows) == 1
+
+    with engine.connect() as connection:
+        assert connection.execute(select(events).order_by(events.c.id)).all() == [
+            (1, True, datetime.date(2025, 3, 1), datetime.datetime(2025, 3, 1, 12, 30), {'a': 1}),
+            (2, False, None, None, None),
+            (3, True, datetime.date(2025, 3, 2), None, [1]),
+        ]
+
+    engine.dispose()
+
+
+def test_copy_csv_value():
+    assert _copy_csv_value(None) == ''
+    assert _copy_csv_value('a "b"') == '"a ""b"""'
+    assert _copy_csv_value({'a': [1, None]}) == '"{""a"": [1, null]}"'
+    assert _copy_csv_value(['a', None, 'b"c'], True) == '"{""a"",NULL,""b\\""c""}"'
+
+
+class DatabaseService:
+    def __init__(self, engine):
+        self.metadatas = [bulk_metadata]
+        self.engine = engine
+
+    def get_engine(self, metadata):
+        return self.engine
+
+
+def test_dump_output(tmp_path):
+    engine = create_engine('sqlite:///' + str(tmp_path / 'dump.db'))
+    bulk_metadata.create_all(engine)
+    bulk_load(engine, measures, ['id', 'label', 'value'], [(1, 'one', 1), (2, 'two', 2)])
+
+    dump = Dump.__new__(Dump)
+    database_service = DatabaseService(engine)
+
+    # All the tables, even only one, are exported into a directory
+    dump.run(database_service, None, None, 'csv', str(tmp_path / 'all'), 100, 1)
+    assert (tmp_path / 'all' / 'measures.csv').read_text().splitlines() == ['id,label,value', '1,one,1', '2,two,2']
+
+    dump.run(database_service, None, ['measures'], 'jsonl', str(tmp_path / 'measures.jsonl'), 100, 1)
+    assert len((tmp_path / 'measures.jsonl').read_text().splitlines()) == 2
+
+    dump.run(database_service, None, ['measures'], 'jsonl', str(tmp_path / 'all'), 100, 1)
+    assert (tmp_path / 'all' / 'measures.jsonl').exists()
+
+    engine.dispose()
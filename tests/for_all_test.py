@@ -0,0 +1,65 @@
+# --
+# Copyright (c) 2008-2025 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+from sqlalchemy import Table, Column, Integer, MetaData, inspect, create_engine
+
+from nagare.services.database import Database
+from nagare.admin.database_commands import print_durations
+
+
+class DatabaseService:
+    for_all = Database.for_all
+
+    def __init__(self, engines):
+        self.engines = engines
+
+    @property
+    def metadatas(self):
+        return list(self.engines)
+
+    def get_engine(self, metadata):
+        return self.engines[metadata]
+
+
+def create_service(tmp_path):
+    engines = {}
+    for name in ('db1', 'db2', 'db3'):
+        metadata = MetaData()
+        metadata.name = name
+        Table(name + '_table', metadata, Column('id', Integer, primary_key=True))
+        engines[metadata] = create_engine('sqlite:///' + str(tmp_path / (name + '.db')))
+
+    return DatabaseService(engines)
+
+
+def table_names(service):
+    return [sorted(inspect(engine).get_table_names()) for engine in service.engines.values()]
+
+
+def test_for_all(tmp_path):
+    service = create_service(tmp_path)
+
+    durations = service.for_all(None, Database._create_all, 2)
+    assert sorted(durations) == ['db1', 'db2', 'db3']
+    assert all(duration >= 0 for duration in durations.values())
+    assert table_names(service) == [['db1_table'], ['db2_table'], ['db3_table']]
+
+    assert list(service.for_all('db2', Database._drop_all, 2)) == ['db2']
+    assert table_names(service) == [['db1_table'], [], ['db3_table']]
+
+    assert sorted(service.for_all(None, Database._drop_all)) == ['db1', 'db2', 'db3']
+    assert table_names(service) == [[], [], []]
+
+
+def test_print_durations(capsys):
+    print_durations('created', {'db2': 0.5, 'db1': 1.25}, 1)
+    assert capsys.readouterr().out == ''
+
+    print_durations('created', {'db2': 0.5, 'db1': 1.25}, 2)
+    assert capsys.readouterr().out == 'Database `db1` created in 1.25s\nDatabase `db2` created in 0.50s\n'
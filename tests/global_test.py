@@ -10,18 +10,21 @@
 import os
 import csv
 
-from sqlalchemy import Unicode
+import pytest
+from sqlalchemy import Unicode, exc, orm, text
 
 from nagare.database import (
     Field,
     Entity,
     ManyToOne,
     OneToMany,
+    ReadOnlyError,
+    batched,
     session,
-    metadata,
+    set_read_only,
     configure_mappers,
-    configure_database,
 )
+from nagare.services.database import Session, Database
 
 
 class Language(Entity):
@@ -43,10 +46,7 @@ class Child(Entity):
 
 configure_mappers(list)
 
-
-def setup_function(_):
-    engine = configure_database('sqlite://')
-    metadata.create_all(engine)
+pytestmark = pytest.mark.usefixtures('database_session')
 
 
 def test_1():
@@ -104,3 +104,72 @@ def test4():
     assert f is c2.father
 
     assert all(elt.father.id == f.id for elt in Child.all())
+
+
+def test5():
+    """Database - read-only session."""
+    Language(id='english', label='hello world')
+    session.commit()
+
+    set_read_only()
+    assert not session.autoflush
+
+    language = Language.get('english')
+    language.label = 'hi world'
+    with pytest.raises(ReadOnlyError):
+        session.flush()
+
+    if session.get_bind(Language.__mapper__).dialect.name == 'sqlite':
+        with pytest.raises(exc.OperationalError, match='readonly'):
+            session.execute(
+                text("INSERT INTO tests_global_test_language VALUES ('german', 'hallo welt')"),
+                bind_arguments={'mapper': Language.__mapper__},
+            )
+
+    session.rollback()
+    assert session.autoflush
+
+    Language(id='french', label='bonjour monde')
+    session.flush()
+    assert Language.count() == 2
+
+
+def test6():
+    """Database - batched session."""
+    expunged = []
+    for i in batched(range(25), 10):
+        Child(name='Child%d' % i)
+        expunged.append(len(session.identity_map) + len(session.new))
+
+    assert expunged[9] == 10
+    assert expunged[10] == 1
+    assert not session.identity_map and not session.new
+    assert Child.count() == 25
+
+
+class Request:
+    method = 'GET'
+
+
+class Chain:
+    def __init__(self, sessions):
+        self.sessions = sessions
+
+    def next(self, **params):
+        return [('read_only' in db_session().info, db_session().info.get('tenant')) for db_session in self.sessions]
+
+
+def test7():
+    """Database - read-only and tenant of all the configured sessions."""
+    other_session = orm.scoped_session(orm.sessionmaker(class_=Session))
+
+    database_service = Database.__new__(Database)
+    database_service.sessions = {session, other_session}
+    database_service.read_only_methods = {'GET'}
+    database_service.tenant_resolver = lambda request: 'tenant1'
+    database_service.time_budget = None
+    database_service.profiling = False
+
+    sessions = [session, other_session]
+    assert database_service.handle_request(Chain(sessions), request=Request()) == [(True, 'tenant1'), (True, 'tenant1')]
+    assert [('read_only' in s().info, s().info.get('tenant')) for s in sessions] == [(False, None), (False, None)]
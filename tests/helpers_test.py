@@ -0,0 +1,197 @@
+# --
+# Copyright (c) 2008-2025 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+import pytest
+from sqlalchemy import Float, Boolean, Integer, Unicode, func, event, inspect
+
+from nagare.database import Field, Entity, session, configure_mappers
+
+
+class Product8(Entity):
+    name = Field(Unicode(100))
+    price = Field(Float)
+    stock = Field(Integer)
+    active = Field(Boolean, default=True)
+
+
+class Translation8(Entity):
+    using_options = {'auto_primarykey': False}
+
+    lang = Field(Unicode(2), primary_key=True)
+    key = Field(Unicode(50), primary_key=True)
+    label = Field(Unicode(100))
+
+
+configure_mappers(list)
+
+pytestmark = pytest.mark.usefixtures('database_session')
+
+
+def create_products():
+    for i in range(1, 6):
+        Product8(name='product_%d' % i, price=i * 1.5, stock=i * 10, active=bool(i % 2))
+    session.flush()
+    session.expunge_all()
+
+
+def test_rows():
+    create_products()
+
+    rows = Product8.rows(Product8.name, Product8.price, Product8.stock > 20, active=True)
+    assert [(row.name, row.price) for row in rows] == [('product_3', 4.5), ('product_5', 7.5)]
+    assert not session.identity_map
+
+    assert set(Product8.rows(Product8.name == 'product_1')[0]._fields) == {'id', 'name', 'price', 'stock', 'active'}
+
+    assert Product8.values(Product8.name, Product8.active, Product8.stock < 30) == [
+        ('product_1', True),
+        ('product_2', False),
+    ]
+    assert Product8.values(Product8.stock, ~Product8.active) == [20, 40]
+    assert not session.identity_map
+
+
+def test_all_columns():
+    create_products()
+
+    rows = Product8.rows()
+    assert len(rows) == 5
+    assert set(rows[0]._fields) == {'id', 'name', 'price', 'stock', 'active'}
+    assert [row.stock for row in Product8.rows(name='product_2')] == [20]
+
+    values = Product8.values(active=False)
+    assert [len(row) for row in values] == [5, 5]
+    assert {'product_2', 20} <= set(values[0])
+
+    columns = Product8.to_columns()
+    assert set(columns) == {'id', 'name', 'price', 'stock', 'active'}
+    assert list(columns['stock']) == [10, 20, 30, 40, 50]
+    assert not session.identity_map
+
+
+def test_to_columns():
+    create_products()
+    Product8(name='product_6', price=None, stock=60)
+    session.flush()
+
+    columns = Product8.to_columns(Product8.name, Product8.price, Product8.stock, Product8.active, chunk_size=2)
+    assert list(columns) == ['name', 'price', 'stock', 'active']
+    assert list(columns['name']) == ['product_%d' % i for i in range(1, 7)]
+    assert list(columns['price']) == [1.5, 3.0, 4.5, 6.0, 7.5, None]
+    assert list(columns['stock']) == [10, 20, 30, 40, 50, 60]
+    assert [bool(active) for active in columns['active']] == [True, False, True, False, True, True]
+
+    assert columns['price'].__class__ is list
+    assert columns['stock'].__class__ is not list
+
+
+def test_get_many():
+    create_products()
+    ids = dict(Product8.values(Product8.name, Product8.id))
+    product1 = Product8.get(ids['product_1'])
+
+    statements = []
+
+    def count_statements(*args):
+        statements.append(args[2])
+
+    connection = session.connection(bind_arguments={'mapper': Product8.__mapper__})
+    event.listen(connection, 'before_cursor_execute', count_statements)
+    products = Product8.get_many([ids['product_3'], -1, ids['product_1'], ids['product_2'], ids['product_3']], 1)
+    event.remove(connection, 'before_cursor_execute', count_statements)
+
+    assert [product and product.name for product in products] == [
+        'product_3',
+        None,
+        'product_1',
+        'product_2',
+        'product_3',
+    ]
+    assert products[2] is product1
+    assert products[0] is products[4]
+    assert len(statements) == 3
+
+    Translation8(lang='en', key='hello', label='Hello')
+    Translation8(lang='fr', key='hello', label='Bonjour')
+    session.flush()
+    session.expunge_all()
+
+    translations = Translation8.get_many([('fr', 'hello'), ('de', 'hello'), ('en', 'hello')])
+    assert [translation and translation.label for translation in translations] == ['Bonjour', None, 'Hello']
+
+
+def test_get_many_coerced_keys():
+    create_products()
+    ids = dict(Product8.values(Product8.name, Product8.id))
+    session.expunge_all()
+
+    products = Product8.get_many([str(ids['product_1']), ids['product_2']])
+    assert [product and product.name for product in products] == ['product_1', 'product_2']
+    assert products[0] is Product8.get(ids['product_1'])
+
+
+def test_update_delete_where():
+    create_products()
+    product1 = Product8.get_by(name='product_1')
+    product2 = Product8.get_by(name='product_2')
+
+    assert Product8.update_where(Product8.stock < 30, stock=0) == 2
+    assert (product1.stock, product2.stock) == (0, 0)
+
+    assert Product8.update_where(Product8.name == 'product_1', synchronize_session='expire', price=0.5) == 1
+    assert inspect(product1).expired_attributes == {'price'}
+    assert product1.price == 0.5
+
+    assert Product8.delete_where(Product8.stock == 0) == 2
+    assert product1 not in session
+    assert Product8.values(Product8.name) == ['product_3', 'product_4', 'product_5']
+
+
+def test_statements_cache():
+    create_products()
+    Product8(name=None, stock=0)
+    session.flush()
+
+    cache = Product8.__statements__
+    hits = cache.hits
+
+    assert Product8.get_by(name='product_2').stock == 20
+    assert Product8.get_by(name='product_3').stock == 30
+    assert Product8.get_by(name=None).stock == 0
+    assert Product8.one_by(name='product_4', active=False).stock == 40
+    assert Product8.single_by(name='product_4', active=True) is None
+    assert Product8.exists(name='product_5')
+    assert not Product8.exists(name='product_6')
+    assert Product8.count() == 6
+
+    assert cache.hits - hits >= 3
+    assert cache.info()['size'] == len(cache)
+
+
+def test_statements_cache_expressions():
+    create_products()
+
+    size = len(Product8.__statements__)
+    assert Product8.get_by(name=func.lower('PRODUCT_2')).stock == 20
+    assert Product8.get_by(name=func.lower('PRODUCT_3')).stock == 30
+    assert Product8.get_by(stock=Product8.stock) is not None
+    assert Product8.exists(stock=Product8.stock)
+    assert len(Product8.__statements__) == size
+
+
+def test_select():
+    create_products()
+
+    statement = Product8.select(Product8.stock > 30).order_by(Product8.stock)
+    assert [product.name for product in session.scalars(statement)] == ['product_4', 'product_5']
+
+    assert [product.name for product in Product8.scalars(Product8.stock < 30, active=False)] == ['product_2']
+    assert Product8.scalars(name='product_6').first() is None
+    assert len(Product8.all()) == 5
+    assert Product8.first().name == 'product_1'
@@ -51,6 +51,15 @@ class Tag3_4(Entity):
     movies = ManyToMany('Movie3_4')
 
 
+class Movie3_5(Entity):
+    name = Field(Text)
+    tags = ManyToMany('Tag3_5', local_first=True, without_rowid=True)
+
+
+class Tag3_5(Entity):
+    name = Field(Text)
+
+
 configure_mappers(list)
 
 engine = configure_database('sqlite://')
@@ -148,3 +157,29 @@ def test5():
 
     assert {movie.name for movie in tag1.movies} == {'manytomany_test5_1', 'manytomany_test5_2'}
     assert {movie.name for movie in tag2.movies} == {'manytomany_test5_2'}
+
+
+def test6():
+    table = Movie3_1.tags.property.secondary
+    assert [column.name for column in table.primary_key] == [
+        'tests_manytomany_test_tag3_1_id',
+        'tests_manytomany_test_movie3_1_id',
+    ]
+    assert [[column.name for column in index.columns] for index in table.indexes] == [
+        ['tests_manytomany_test_movie3_1_id']
+    ]
+
+    table = Movie3_5.tags.property.secondary
+    assert [column.name for column in table.primary_key] == [
+        'tests_manytomany_test_movie3_5_id',
+        'tests_manytomany_test_tag3_5_id',
+    ]
+    assert [[column.name for column in index.columns] for index in table.indexes] == [
+        ['tests_manytomany_test_tag3_5_id']
+    ]
+    assert table.dialect_options['sqlite']['with_rowid'] is False
+
+    movie = Movie3_5(name='manytomany_test6', tags=[Tag3_5(name='manytomany_test6')])
+    session.commit()
+
+    assert [tag.name for tag in movie.tags] == ['manytomany_test6']
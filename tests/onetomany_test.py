@@ -13,6 +13,7 @@ from sqlalchemy import Text
 from nagare.database import (
     Field,
     Entity,
+    OneToOne,
     ManyToOne,
     OneToMany,
     session,
@@ -60,6 +61,36 @@ class Child1_4(Entity):
     parent = ManyToOne('Parent1_4')
 
 
+class Parent1_5(Entity):
+    name = Field(Text)
+    children = OneToMany('Child1_5', collection='paged')
+
+
+class Child1_5(Entity):
+    name = Field(Text)
+    parent = ManyToOne('Parent1_5')
+
+
+class Parent1_6(Entity):
+    name = Field(Text)
+    children = OneToMany('Child1_6', collection='write_only')
+
+
+class Child1_6(Entity):
+    name = Field(Text)
+    parent = ManyToOne('Parent1_6')
+
+
+class Parent1_7(Entity):
+    name = Field(Text)
+    children = OneToMany('Child1_7', counter_cache='nb_children')
+
+
+class Child1_7(Entity):
+    name = Field(Text)
+    parent = ManyToOne('Parent1_7')
+
+
 configure_mappers(list)
 
 engine = configure_database('sqlite://')
@@ -209,3 +240,103 @@ def test11():
     assert {child.name for child in parent.children} == {'onetomany_test11_1', 'onetomany_test11_2'}
     assert child1.parent.name == 'onetomany_test11'
     assert child2.parent.name == 'onetomany_test11'
+
+
+def test12():
+    parent = Parent1_5(name='onetomany_test12')
+    for i in range(10):
+        parent.children.append(Child1_5(name='onetomany_test12_{}'.format(i)))
+    child = Child1_5(name='onetomany_test12_10', parent=parent)
+
+    session.commit()
+
+    assert parent.children.count() == 11
+    assert child.parent.name == 'onetomany_test12'
+    assert [len(batch) for batch in parent.children.batches(4)] == [4, 4, 3]
+    assert parent.children.filter(Child1_5.name == 'onetomany_test12_3').one().name == 'onetomany_test12_3'
+
+    parent.children.remove(child)
+    session.commit()
+
+    assert parent.children.count() == 10
+    assert child.parent is None
+
+
+def test13():
+    parent = Parent1_6(name='onetomany_test13')
+    parent.children.add_all([Child1_6(name='onetomany_test13_1'), Child1_6(name='onetomany_test13_2')])
+
+    session.commit()
+
+    children = session.scalars(parent.children.select().order_by(Child1_6.name)).all()
+    assert [child.name for child in children] == ['onetomany_test13_1', 'onetomany_test13_2']
+    assert children[0].parent.name == 'onetomany_test13'
+
+    with pytest.raises(TypeError):
+        list(parent.children)
+
+
+def test14():
+    with pytest.raises(ValueError, match='Invalid collection'):
+        OneToMany('Child1_5', collection='unknown')
+
+
+def test15():
+    parent1 = Parent1_7(name='onetomany_test15_1')
+    parent2 = Parent1_7(name='onetomany_test15_2')
+    child1 = Child1_7(name='onetomany_test15_1', parent=parent1)
+    child2 = Child1_7(name='onetomany_test15_2', parent=parent1)
+    child3 = Child1_7(name='onetomany_test15_3')
+    parent2.children.append(child3)
+
+    session.commit()
+
+    assert (parent1.nb_children, parent2.nb_children) == (2, 1)
+
+    child1.parent = parent2
+    session.flush()
+
+    assert (parent1.nb_children, parent2.nb_children) == (1, 2)
+
+    child2.delete()
+    Child1_7(name='onetomany_test15_4', parent=parent2)
+    session.commit()
+
+    assert (parent1.nb_children, parent2.nb_children) == (0, 3)
+
+    child3.parent = None
+    session.commit()
+
+    assert (parent1.nb_children, parent2.nb_children) == (0, 2)
+
+
+def test16():
+    with pytest.raises(ValueError, match='Invalid counter_cache'):
+        ManyToOne('Parent1_7', counter_cache='nb')
+
+    with pytest.raises(ValueError, match='Invalid counter_cache'):
+        OneToOne('Parent1_7', counter_cache='nb')
+
+
+def test17():
+    parent1 = Parent1_7(name='onetomany_test17_1')
+    parent2 = Parent1_7(name='onetomany_test17_2')
+    for i in range(3):
+        Child1_7(name='onetomany_test17_%d' % i, parent=parent1)
+    session.commit()
+
+    assert (parent1.nb_children, parent2.nb_children) == (3, 0)
+
+    assert Child1_7.update_where(Child1_7.name == 'onetomany_test17_0', parent_id=parent2.id) == 1
+    assert (parent1.nb_children, parent2.nb_children) == (2, 1)
+
+    assert Child1_7.update_where(Child1_7.name.like('onetomany_test17_%'), name='renamed') == 3
+    assert (parent1.nb_children, parent2.nb_children) == (2, 1)
+
+    assert Child1_7.delete_where(Child1_7.parent_id == parent1.id) == 2
+    assert (parent1.nb_children, parent2.nb_children) == (0, 1)
+
+    with pytest.raises(ValueError, match='Counter cache'):
+        Child1_7.update_where(parent_id=Child1_7.parent_id + 1)
+
+    session.commit()
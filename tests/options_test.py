@@ -0,0 +1,162 @@
+# --
+# Copyright (c) 2008-2025 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+import pytest
+from sqlalchemy import JSON, Text, Unicode, update, inspect
+
+from nagare.database import (
+    Field,
+    Entity,
+    ManyToOne,
+    OneToMany,
+    ManyToMany,
+    StaleEntity,
+    session,
+    metadata,
+    configure_mappers,
+    configure_database,
+)
+
+
+class Parent5_1(Entity):
+    using_options = {'default_lazy_collection': 'selectin'}
+
+    name = Field(Text)
+    children = OneToMany('Child5_1', inverse='parent')
+    tags = ManyToMany('Tag5_1')
+
+
+class Child5_1(Entity):
+    using_options = {'default_lazy_scalar': 'joined'}
+
+    name = Field(Text)
+
+
+class Tag5_1(Entity):
+    using_options = {'default_lazy_collection': 'raise'}
+
+    name = Field(Text)
+    parents = ManyToMany('Parent5_1')
+
+
+class Parent5_2(Entity):
+    name = Field(Text)
+    children = OneToMany('Child5_2', lazy='joined')
+
+
+class Child5_2(Entity):
+    using_options = {'default_lazy_scalar': 'raise'}
+
+    name = Field(Text)
+    parent = ManyToOne('Parent5_2')
+
+
+class Document5_3(Entity):
+    using_options = {'version_id': True}
+
+    title = Field(Text)
+
+
+class Document5_4(Entity):
+    using_options = {'version_id': 'revision'}
+
+    title = Field(Text)
+
+
+class Article5_5(Entity):
+    using_options = {'defer_large': True, 'defer_group': 'content'}
+
+    title = Field(Unicode(100))
+    body = Field(Text)
+    meta = Field(JSON)
+
+
+configure_mappers(list)
+
+engine = configure_database('sqlite://')
+metadata.create_all(engine)
+
+
+def test_default_lazy():
+    assert Parent5_1.children.property.lazy == 'selectin'
+    assert Parent5_1.tags.property.lazy == 'selectin'
+    assert Tag5_1.parents.property.lazy == 'raise'
+
+    assert Child5_1.parent.property.lazy == 'joined'
+
+    assert Parent5_2.children.property.lazy == 'joined'
+    assert Child5_2.parent.property.lazy == 'raise'
+
+
+def test_default_lazy_loading():
+    parent = Parent5_1(name='default_lazy', children=[Child5_1(name='default_lazy_1'), Child5_1(name='default_lazy_2')])
+    session.flush()
+    parent_id = parent.id
+    session.commit()
+    session.expunge_all()
+
+    parent = Parent5_1.get(parent_id)
+    session.expunge(parent)
+
+    assert {child.name for child in parent.children} == {'default_lazy_1', 'default_lazy_2'}
+
+
+def test_version_id():
+    assert Document5_3.__mapper__.version_id_col is Document5_3.__table__.c.version_id
+    assert Document5_4.__mapper__.version_id_col is Document5_4.__table__.c.revision
+
+    document = Document5_3(title='draft')
+    session.flush()
+    assert document.version_id == 1
+
+    document.title = 'final'
+    session.flush()
+    assert document.version_id == 2
+
+    # Concurrent update
+    session.execute(update(Document5_3).values(version_id=3).execution_options(synchronize_session=False))
+
+    document.title = 'published'
+    with pytest.raises(StaleEntity):
+        session.flush()
+
+    session.rollback()
+
+
+def test_version_id_update_where():
+    document = Document5_4(title='draft')
+    session.flush()
+    assert document.revision == 1
+
+    assert Document5_4.update_where(Document5_4.id == document.id, title='final') == 1
+    assert (document.title, document.revision) == ('final', 2)
+
+    assert Document5_4.update_where(Document5_4.id == document.id, synchronize_session='expire', title='done') == 1
+    assert (document.title, document.revision) == ('done', 3)
+
+    session.rollback()
+
+
+def test_defer_large():
+    assert not Article5_5.title.property.deferred
+    assert Article5_5.body.property.deferred
+    assert Article5_5.meta.property.group == 'content'
+
+    Article5_5(title='deferred', body='large body', meta={'tags': ['a']})
+    session.commit()
+    session.expunge_all()
+
+    article = Article5_5.get_by(title='deferred')
+    assert inspect(article).unloaded == {'body', 'meta'}
+    assert article.body == 'large body'
+
+    session.expunge_all()
+    article = Article5_5.undefer().filter_by(title='deferred').one()
+    assert not inspect(article).unloaded
+    session.rollback()
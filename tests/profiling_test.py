@@ -0,0 +1,142 @@
+# --
+# Copyright (c) 2008-2025 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+from sqlalchemy import Integer, MetaData, select, update
+
+from nagare.database import Field, Entity, session, configure_mappers, configure_database
+from nagare.services import database_profiling
+from nagare.services.database import Database
+
+profiling_metadata = MetaData()
+profiling_metadata.name = 'profiling'
+
+
+class Counter9(Entity):
+    using_options = {'metadata': profiling_metadata}
+
+    value = Field(Integer)
+
+
+configure_mappers(list)
+
+engine = configure_database('sqlite://', metadata=profiling_metadata)
+profiling_metadata.create_all(engine)
+
+database_profiling.profile_orm()
+database_profiling.profile_engine(engine)
+
+
+def test_profile():
+    profile = database_profiling.Profile()
+    token = database_profiling.current_profile.set(profile)
+    try:
+        for i in range(3):
+            Counter9(value=i)
+        session.flush()
+
+        session.execute(update(Counter9).values(value=42))
+        session.expunge_all()
+        assert len(Counter9.all()) == 3
+        session.rollback()
+    finally:
+        database_profiling.current_profile.reset(token)
+
+    assert profile.flushes == 1
+    assert profile.loaded == 3
+    assert profile.affected_rows >= 3  # The 3 updated rows, plus the inserted ones if the driver reports them
+    assert profile.engines == {engine}
+
+    profile_dict = profile.to_dict({engine: 'profiling'})
+    assert profile_dict['statements'] == profile.statements >= 3
+    assert profile_dict['engines'] == ['profiling']
+
+    log = profile.to_log({engine: 'profiling'})
+    assert 'loaded=3 ' in log
+    assert log.endswith(' engines=profiling')
+
+    assert database_profiling.Profile().to_log() == (
+        'statements=0 db_time_ms=0.0 flushes=0 flush_time_ms=0.0 fetched_rows=0 affected_rows=0 loaded=0 engines=-'
+    )
+    assert profile.to_server_timing().startswith('db;dur=')
+    assert '"{} statements"'.format(profile.statements) in profile.to_server_timing()
+
+
+def test_fetched_rows():
+    for i in range(3):
+        Counter9(value=i)
+    session.flush()
+
+    profile = database_profiling.Profile()
+    token = database_profiling.current_profile.set(profile)
+    try:
+        assert len(Counter9.all()) == 3  # ORM
+        assert len(session.execute(select(Counter9.value)).all()) == 3  # Core
+        assert session.execute(select(Counter9.value)).first() is not None  # All the rows are fetched anyway
+        with engine.connect() as connection:
+            assert len(connection.execute(select(Counter9.__table__)).fetchmany(2)) == 2
+    finally:
+        database_profiling.current_profile.reset(token)
+        session.rollback()
+
+    assert profile.fetched_rows == 3 + 3 + 3 + 2
+
+
+def test_profile_outside_request():
+    Counter9(value=1)
+    session.flush()
+    session.rollback()
+
+    assert database_profiling.current_profile.get() is None
+
+
+class Logger:
+    def __init__(self):
+        self.records = []
+
+    def info(self, msg, extra):
+        self.records.append((msg, extra))
+
+
+class Headers(list):
+    def add(self, name, value):
+        self.append((name, value))
+
+
+class Response:
+    def __init__(self):
+        self.headers = Headers()
+
+
+class Chain:
+    @staticmethod
+    def next(**params):
+        Counter9.all()
+        session.rollback()
+
+        return Response()
+
+
+class DatabaseService:
+    logger = Logger()
+    server_timing = True
+
+
+def test_profile_request():
+    response = Database.profile_request(DatabaseService, Chain)
+
+    ((msg, extra),) = DatabaseService.logger.records
+    assert extra['database_profile']['statements'] >= 1
+    assert 'profiling' in extra['database_profile']['engines']
+    assert msg.startswith('statements=')
+
+    ((name, value),) = response.headers
+    assert name == 'Server-Timing'
+    assert value.startswith('db;dur=')
+
+    assert database_profiling.current_profile.get() is None
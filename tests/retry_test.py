@@ -0,0 +1,74 @@
+# --
+# Copyright (c) 2008-2025 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+import sqlite3
+
+import pytest
+from sqlalchemy import exc
+
+from nagare.database import StaleEntity
+from nagare.services.database import Database
+from nagare.services.database_retry import RetryPolicy, is_retriable
+
+LOCKED = exc.OperationalError('UPDATE', {}, sqlite3.OperationalError('database is locked'))
+SYNTAX_ERROR = exc.OperationalError('UPDAT', {}, sqlite3.OperationalError('near "UPDAT": syntax error'))
+
+
+def test_retriable():
+    assert is_retriable(LOCKED)
+    assert not is_retriable(SYNTAX_ERROR)
+    assert not is_retriable(ValueError())
+    assert not is_retriable(StaleEntity())
+
+
+def test_retry():
+    delays = []
+    runs = []
+
+    def f(*errors):
+        runs.append(None)
+        if len(runs) <= len(errors):
+            raise errors[len(runs) - 1]
+
+        return len(runs)
+
+    retry = RetryPolicy(attempts=3, backoff=0.1, jitter=False, sleep=delays.append)
+    assert retry(f, LOCKED, LOCKED) == 3
+    assert delays == [0.1, 0.2]
+
+    del runs[:]
+    with pytest.raises(exc.OperationalError):
+        retry(f, LOCKED, LOCKED, LOCKED)
+    assert len(runs) == 3
+
+    del runs[:]
+    with pytest.raises(exc.OperationalError):
+        retry(f, SYNTAX_ERROR)
+    assert len(runs) == 1
+
+    with pytest.raises(ValueError, match='Invalid number of attempts'):
+        RetryPolicy(attempts=0)
+
+
+class Session:
+    def __init__(self, in_transaction):
+        self.in_transaction = lambda: in_transaction
+
+
+class DatabaseService:
+    retry_policy = RetryPolicy()
+
+
+def test_retry_in_transaction():
+    DatabaseService.sessions = {Session(False)}
+    assert Database.retry(DatabaseService, lambda x: x * 2, 21) == 42
+
+    DatabaseService.sessions = {Session(False), Session(True)}
+    with pytest.raises(RuntimeError):
+        Database.retry(DatabaseService, lambda x: x * 2, 21)
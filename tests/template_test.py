@@ -0,0 +1,68 @@
+# --
+# Copyright (c) 2008-2025 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+import os
+
+import pytest
+from sqlalchemy import Table, Column, Integer, Unicode, MetaData, select, create_engine
+
+from nagare.services.database import get_engine, get_template_key, get_sqlite_template, clone_sqlite_database
+
+template_metadata = MetaData()
+users = Table('users', template_metadata, Column('id', Integer, primary_key=True), Column('name', Unicode(20)))
+groups = Table('groups', template_metadata, Column('id', Integer, primary_key=True), Column('name', Unicode(20)))
+
+populates = []
+
+
+def populate():
+    populates.append(None)
+    with get_engine(template_metadata).begin() as connection:
+        connection.execute(users.insert(), [{'name': 'admin'}, {'name': 'guest'}])
+
+
+def populate_users():
+    users.insert().values(name='admin', roles={'read', 'write'})
+
+
+def populate_groups():
+    groups.insert().values(name='admin', roles={'read', 'write'})
+
+
+def test_template_key():
+    assert get_template_key(template_metadata, populate_users) == get_template_key(template_metadata, populate_users)
+
+    populate_groups.__qualname__ = populate_users.__qualname__
+    assert get_template_key(template_metadata, populate_users) != get_template_key(template_metadata, populate_groups)
+
+
+def test_template(tmp_path):
+    for _ in range(2):
+        template = get_sqlite_template(template_metadata, populate, str(tmp_path))
+        assert template.startswith(str(tmp_path))
+
+        engine = create_engine('sqlite://')
+        clone_sqlite_database(template, engine)
+
+        with engine.connect() as connection:
+            assert connection.execute(select(users.c.name).order_by(users.c.id)).scalars().all() == ['admin', 'guest']
+
+    assert len(populates) == 1
+
+
+def test_template_directory(tmp_path):
+    directory = tmp_path / 'templates'
+    directory.mkdir()
+    os.chmod(str(directory), 0o777)  # noqa: S103
+
+    with pytest.raises(PermissionError):
+        get_sqlite_template(template_metadata, populate, str(directory))
+
+    get_sqlite_template(template_metadata, populate, str(tmp_path / 'private'))
+    assert os.stat(str(tmp_path / 'private')).st_mode & 0o777 == 0o700
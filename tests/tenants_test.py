@@ -0,0 +1,88 @@
+# --
+# Copyright (c) 2008-2025 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+import pytest
+from sqlalchemy import Text, MetaData, event
+
+from nagare.database import Field, Entity, session, set_tenant, configure_mappers, configure_database
+
+tenants_metadata = MetaData()
+
+
+class Account6(Entity):
+    using_options = {'metadata': tenants_metadata}
+
+    name = Field(Text)
+
+
+configure_mappers(list)
+
+engine = configure_database('sqlite://', metadata=tenants_metadata, tenants=True)
+
+
+@event.listens_for(engine, 'connect')
+def attach_tenant(dbapi_connection, connection_record):
+    dbapi_connection.execute("ATTACH DATABASE ':memory:' AS tenant1")
+
+
+tenants_metadata.create_all(engine)
+tenants_metadata.create_all(engine.execution_options(schema_translate_map={None: 'tenant1'}))
+
+
+def test_tenant():
+    Account6(name='default')
+    session.commit()
+    session.close()
+
+    set_tenant('tenant1')
+    Account6(name='tenant1_1')
+    Account6(name='tenant1_2')
+    session.commit()
+    assert {account.name for account in Account6.all()} == {'tenant1_1', 'tenant1_2'}
+    session.close()
+
+    set_tenant(None)
+    assert [account.name for account in Account6.all()] == ['default']
+    session.close()
+
+
+def test_tenant_change():
+    for tenant in (None, 'tenant1'):
+        set_tenant(tenant)
+        Account6(id=1000, name='change_' + (tenant or 'default'))
+        session.commit()
+        session.close()
+
+    set_tenant(None)
+    try:
+        account = Account6.get(1000)
+        assert account.name == 'change_default'
+        session.commit()
+
+        # Same identity in several tenants
+        with pytest.raises(RuntimeError):
+            set_tenant('tenant1')
+
+        session.expunge(account)
+        set_tenant('tenant1')
+        assert Account6.get(1000).name == 'change_tenant1'
+
+        set_tenant('tenant1')
+        with pytest.raises(RuntimeError):
+            set_tenant(None)
+    finally:
+        session.rollback()
+        for tenant in (None, 'tenant1'):
+            session.close()
+            set_tenant(tenant)
+            Account6.delete_where(Account6.id == 1000)
+            session.commit()
+
+        session.close()
+        set_tenant(None)
@@ -0,0 +1,75 @@
+# --
+# Copyright (c) 2008-2025 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+import pytest
+from sqlalchemy import MetaData, text
+
+from nagare.database import DatabaseTimeout, configure_database
+from nagare.services import database_timeouts
+
+LONG_QUERY = text('WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT count(*) FROM n')
+
+engine = configure_database('sqlite://', metadata=MetaData(), statement_timeout=50)
+database_timeouts.budget_engine(engine)
+
+
+def test_statement_timeout():
+    with engine.connect() as connection:
+        with pytest.raises(DatabaseTimeout):
+            connection.execute(LONG_QUERY)
+
+        assert connection.execute(text('SELECT 42')).scalar() == 42
+
+
+def test_time_budget():
+    token = database_timeouts.current_budget.set(database_timeouts.Budget(20))
+    try:
+        with engine.connect() as connection:
+            assert connection.execute(text('SELECT 42')).scalar() == 42
+
+            with pytest.raises(DatabaseTimeout):
+                connection.execute(LONG_QUERY)
+
+            with pytest.raises(DatabaseTimeout):
+                connection.execute(text('SELECT 42'))
+    finally:
+        database_timeouts.current_budget.reset(token)
+
+    with engine.connect() as connection:
+        assert connection.execute(text('SELECT 42')).scalar() == 42
+
+
+class DBAPIConnection:
+    def __init__(self):
+        self.autocommit = False
+        self.statements = []
+
+    def cursor(self):
+        return self
+
+    def execute(self, statement):
+        self.statements.append((statement, self.autocommit))
+
+    def close(self):
+        pass
+
+
+def test_connection_settings():
+    connection = DBAPIConnection()
+    database_timeouts._set_postgresql_timeout(connection, 500)
+    assert connection.statements == [('SET statement_timeout = 500', True)]
+    assert connection.autocommit is False
+
+    connection = DBAPIConnection()
+    database_timeouts._set_mysql_timeout(connection, 500, False)
+    database_timeouts._set_mysql_timeout(connection, 500, True)
+    assert [statement for statement, _ in connection.statements] == [
+        'SET SESSION max_execution_time = 500',
+        'SET SESSION max_statement_time = 0.5',
+    ]
@@ -0,0 +1,99 @@
+# --
+# Copyright (c) 2008-2025 Net-ng.
+# All rights reserved.
+#
+# This software is licensed under the BSD License, as described in
+# the file LICENSE.txt, which you should have received as part of
+# this distribution.
+# --
+
+import pytest
+from sqlalchemy import Integer, MetaData, orm
+
+from nagare.database import Field, Entity, configure_mappers, configure_database
+from nagare.services.database import Session, register_adaptive_twophases
+
+metadata1 = MetaData()
+metadata2 = MetaData()
+
+
+class Account10(Entity):
+    using_options = {'metadata': metadata1}
+
+    balance = Field(Integer)
+
+
+class Transfer10(Entity):
+    using_options = {'metadata': metadata2}
+
+    amount = Field(Integer)
+
+
+configure_mappers(list)
+
+engines = {}
+for name, metadata in (('db1', metadata1), ('db2', metadata2)):
+    engines[name] = configure_database('sqlite://', metadata=metadata)
+    metadata.create_all(engines[name])
+
+
+@pytest.fixture
+def twophases_calls(monkeypatch):
+    calls = []
+
+    for name, engine in engines.items():
+        dialect = engine.dialect
+
+        def begin(connection, xid, dialect=dialect):
+            dialect.do_begin(connection.connection)
+
+        def prepare(connection, xid, name=name):
+            calls.append((name, 'prepare'))
+
+        def commit(connection, xid, is_prepared=True, recover=False, name=name, dialect=dialect):
+            calls.append((name, 'commit', is_prepared))
+            dialect.do_commit(connection.connection)
+
+        def rollback(connection, xid, is_prepared=True, recover=False, dialect=dialect):
+            dialect.do_rollback(connection.connection)
+
+        monkeypatch.setattr(dialect, 'do_begin_twophase', begin, raising=False)
+        monkeypatch.setattr(dialect, 'do_prepare_twophase', prepare, raising=False)
+        monkeypatch.setattr(dialect, 'do_commit_twophase', commit, raising=False)
+        monkeypatch.setattr(dialect, 'do_rollback_twophase', rollback, raising=False)
+
+    return calls
+
+
+def test_adaptive_twophases(twophases_calls):
+    session = orm.sessionmaker(class_=Session, twophase=True)()
+    register_adaptive_twophases(session)
+
+    # One database written: the commit is not prepared
+    session.add(Account10(balance=100, auto_add=False))
+    session.commit()
+    assert twophases_calls == [('db1', 'commit', False)]
+    assert session.twophase
+
+    # Two databases written: prepare then commit on both
+    del twophases_calls[:]
+    session.add(Account10(balance=50, auto_add=False))
+    session.add(Transfer10(amount=50, auto_add=False))
+    session.commit()
+    assert sorted(twophases_calls) == [
+        ('db1', 'commit', True),
+        ('db1', 'prepare'),
+        ('db2', 'commit', True),
+        ('db2', 'prepare'),
+    ]
+    assert session.twophase
+
+    # One database written, the other only read
+    del twophases_calls[:]
+    assert session.query(Transfer10).count() == 1
+    session.add(Account10(balance=10, auto_add=False))
+    session.commit()
+    assert sorted(twophases_calls) == [('db1', 'commit', False), ('db2', 'commit', False)]
+    assert session.twophase
+
+    session.close()